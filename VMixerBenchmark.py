@@ -0,0 +1,692 @@
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import threading
+import time
+
+from VMixerProtocol import ProxySession, IOWorker, WorkerPool, WriteCoalescer, FrameReader, STX, ACK, is_ack, WRITE, VISIBLE, BACKGROUND, KEEPALIVE_INTERVAL
+from VMixerParser import parse_reply, format_level, NEG_INF, REPLY_CACHE
+from VMixerEmulator import Emulator
+from VMixerState import MixerState, query_for_key, save_scene, scene_writes, write_control, SCENE_FIELDS
+from VMixerSync import send_matrix_keys
+from VMixerTouch import HitIndex, TouchRouter
+from VMixerTaper import levels_to_positions, positions_to_levels, np
+
+
+def legacy_send_get_reply(address, password, sock, command):
+    # the pre-session behaviour: authenticate before every command
+    if sock is None:
+        sock = socket.create_connection(address, 5)
+    sock.sendall(STX + bytes('###PWD:' + password + ';', 'ascii'))
+    reply = b''
+    while reply.count(b'"') < 2:
+        reply += sock.recv(64)
+    expected_results = command.count('&') + 1
+    sock.sendall(STX + bytes(command + ';', 'ascii'))
+    reply = b''
+    while reply.count(b';') < expected_results and reply[-1:] != ACK:
+        reply += sock.recv(64)
+    return sock
+
+
+def bench_auth(commands=200, rtt=0.002):
+    queries = ['FDQ:AX' + str(i % 8 + 1) for i in range(commands)]
+    results = {}
+    with Emulator(latency=rtt) as proxy:
+        address = proxy.server_address
+        sock = None
+        start = time.perf_counter()
+        for q in queries:
+            sock = legacy_send_get_reply(address, 'secret', sock, q)
+        elapsed = time.perf_counter() - start
+        sock.close()
+        results['auth_per_command'] = (proxy.messages / commands, elapsed / commands)
+
+        proxy.messages = 0
+        session = ProxySession(address[0], address[1], 'secret')
+        start = time.perf_counter()
+        for q in queries:
+            session.sendGetReply(q)
+        elapsed = time.perf_counter() - start
+        session.close()
+        results['auth_per_connection'] = (proxy.messages / commands, elapsed / commands)
+    return results
+
+
+def main_refresh_queries():
+    ch_ids = ['AX' + str(v) for v in range(1, 9)] + ['MX' + str(v) for v in range(1, 5)] + ['MAL']
+    return (
+        ['CNQ:' + ch for ch in ch_ids]
+        + ['FDQ:' + ch for ch in ch_ids]
+        + ['MUQ:' + ch for ch in ch_ids if ch[:2] != 'MA']
+    )
+
+
+def bench_refresh(rtt=0.002, batch_size=16):
+    queries = main_refresh_queries()
+    results = {}
+    with Emulator(latency=rtt) as proxy:
+        session = ProxySession(*proxy.server_address)
+        session.refresh_socket()
+        proxy.messages = 0
+        start = time.perf_counter()
+        for q in queries:
+            session.sendGetReply(q)
+        results['serial_refresh'] = (proxy.messages, time.perf_counter() - start)
+
+        proxy.messages = 0
+        start = time.perf_counter()
+        session.request_many(queries, batch_size)
+        results['batched_refresh'] = (proxy.messages, time.perf_counter() - start)
+        session.close()
+    return results
+
+
+def connected_worker(proxy, readers=0, keepalive=KEEPALIVE_INTERVAL, **session_args):
+    # a started IOWorker (or a WorkerPool with readers) already connected
+    # to the emulator, so connecting is not part of what a scenario times
+    session = ProxySession(*proxy.server_address, **session_args)
+    if readers:
+        worker = WorkerPool(session, readers, keepalive)
+        worker.start()
+        for future in worker.connect():
+            future.result()
+    else:
+        worker = IOWorker(session, keepalive)
+        worker.start()
+        worker.run(session.refresh_socket).result()
+    return worker
+
+
+def bench_fader_drag(rtt=0.02, drag_events=120, event_rate=120, max_rate=20):
+    # a one second drag at touch event rate, then the release
+    with Emulator(latency=rtt) as proxy:
+        worker = connected_worker(proxy)
+        coalescer = WriteCoalescer(worker, max_rate)
+        for i in range(drag_events):
+            coalescer.write('FDC:AX1', 'FDC:AX1,' + str(-i * 0.5), final=False)
+            time.sleep(1.0 / event_rate)
+            coalescer.pump()
+        coalescer.write('FDC:AX1', 'FDC:AX1,-99.0', final=True)
+        while coalescer.in_flight or coalescer.pending:
+            time.sleep(rtt)
+        worker.stop()
+        stats = coalescer.stats()
+        stats['final_value_sent'] = proxy.last_command == 'FDC:AX1,-99.0'
+    return stats
+
+
+def synthetic_reply(values=500):
+    return b''.join(
+        STX + bytes('AXS:I{},AX{},{:.1f},C;'.format(i % 32 + 1, i % 8 + 1, -i / 10), 'ascii')
+        for i in range(values)
+    )
+
+
+def legacy_read(sock, expected_results):
+    reply = b''
+    while reply.count(b';') < expected_results and reply[-1:] != ACK:
+        sock.settimeout(5)
+        reply += sock.recv(64)
+        sock.settimeout(None)
+    return reply.split(b';')[:-1]
+
+
+def bench_reader(values=500, repeats=50):
+    reply = synthetic_reply(values)
+    results = {}
+    for name in ('recv64_concat', 'frame_reader'):
+        client, server = socket.socketpair()
+        client.settimeout(5)
+        reader = FrameReader(client)
+        elapsed = 0.0
+        for _ in range(repeats):
+            sender = threading.Thread(target=server.sendall, args=(reply,))
+            sender.start()
+            start = time.perf_counter()
+            if name == 'frame_reader':
+                frames = reader.read_frames(values)
+            else:
+                frames = legacy_read(client, values)
+            elapsed += time.perf_counter() - start
+            sender.join()
+            assert len(frames) == values
+        client.close()
+        server.close()
+        results[name] = elapsed / repeats
+    return results
+
+
+def sends_refresh_queries(out_channel='AX1', inputs=32):
+    ch_ids = ['I' + str(i) for i in range(1, inputs + 1)]
+    return (
+        ['CNQ:' + ch for ch in ch_ids]
+        + ['AXQ:' + ch + ',' + out_channel for ch in ch_ids]
+    )
+
+
+def bench_pipeline(rtt=0.03, batch_size=8, windows=(1, 4, 8)):
+    queries = sends_refresh_queries()
+    results = {}
+    with Emulator(latency=rtt) as proxy:
+        session = ProxySession(*proxy.server_address, batch_size=batch_size)
+        session.refresh_socket()
+        for window in windows:
+            session.window = window
+            start = time.perf_counter()
+            replies = session.request_many(queries)
+            assert None not in replies
+            results['window_' + str(window)] = time.perf_counter() - start
+        session.close()
+    return results
+
+
+class BenchControl:
+    # stand-in for a scene control, hit tested against its rect in panel
+    # coordinates like MyButton.handle_touch_begin
+    def __init__(self, x, y, w, h):
+        self.rect = (x, y, w, h)
+        self.calls = 0
+
+    def handle_touch_begin(self, pos, panel_pos):
+        self.calls += 1
+        x, y, w, h = self.rect
+        return x <= panel_pos[0] <= x + w and y <= panel_pos[1] <= y + h
+
+    def handle_touch_drag(self, pos, panel_pos):
+        return False
+
+    def handle_touch_ended(self, pos, panel_pos):
+        return False
+
+
+def strip_controls(strips, width=128, height=600):
+    # mute, fader and sends button per strip, laid out like Main
+    controls = []
+    for r in range(strips):
+        x = width * (r + 0.5)
+        controls.append(BenchControl(x - 30, height - 140, 60, 60))
+        controls.append(BenchControl(x - 10, height / 2 - 145, 20, 240))
+        controls.append(BenchControl(x - 40, 50, 80, 60))
+    return controls
+
+
+class BenchFader(BenchControl):
+    # a send fader: drags write through the coalescer like RFader.send_command
+    def __init__(self, x, y, w, h, output, write):
+        super().__init__(x, y, w, h)
+        self.key = 'AXC:I1,' + output
+        self.write = write
+        self.level = None
+
+    def handle_touch_drag(self, pos, panel_pos):
+        x, y, w, h = self.rect
+        self.level = '{:.1f}'.format(min(max(panel_pos[1] - y, 0), h) / h * 90 - 80)
+        self.write(self.key, self.key + ',' + self.level + ',C', False)
+        return True
+
+    def handle_touch_ended(self, pos, panel_pos):
+        self.handle_touch_drag(pos, panel_pos)
+        self.write(self.key, self.key + ',' + self.level + ',C', True)
+        return True
+
+
+def bench_hit_index(strips=64, touches=5000, width=128, height=600):
+    rng = random.Random(0)
+    points = [(rng.uniform(0, strips * width), rng.uniform(0, height)) for _ in range(touches)]
+    results = {'strips': strips}
+    controls = strip_controls(strips, width, height)
+    start = time.perf_counter()
+    hits = 0
+    for point in points:
+        # the old dispatch: every control is offered the touch
+        hit = False
+        for control in controls:
+            hit = hit or control.handle_touch_begin(point, point)
+        hits += hit
+    results['linear_us'] = (time.perf_counter() - start) / touches * 1e6
+    results['linear_calls'] = sum(control.calls for control in controls) / touches
+    controls = strip_controls(strips, width, height)
+    start = time.perf_counter()
+    index = HitIndex(width, 25)
+    for control in controls:
+        index.add(control, control.rect)
+    router = TouchRouter(index)
+    results['index_build_us'] = (time.perf_counter() - start) * 1e6
+    start = time.perf_counter()
+    indexed_hits = 0
+    for i, point in enumerate(points):
+        indexed_hits += router.began(i, point, point) is not None
+        router.ended(i, point, point)
+    results['index_us'] = (time.perf_counter() - start) / touches * 1e6
+    results['index_calls'] = sum(control.calls for control in controls) / touches
+    results['same_hits'] = hits == indexed_hits
+    return results
+
+
+def legacy_position_text(value):
+    # RFader.get_value before VMixerTaper
+    if value < 0.02:
+        return 'INF'
+    return '{:.1f}'.format((value - 0.02) / 0.98 * 90 - 80)
+
+
+def legacy_text_position(val):
+    # RFader.set_value before VMixerTaper, '* 0.98' was never applied
+    if val.lower() == 'inf':
+        return 0.0
+    return (float(val) + 80) / 90 + 0.02
+
+
+def bench_taper(repeats=200):
+    # the whole send matrix from levels to fader positions and back, per
+    # value with the old formula and with the tables, as a list and (when
+    # numpy is there) as an array
+    mixer = MixerState()
+    rng = random.Random(0)
+    for i in range(len(mixer.sends)):
+        mixer.sends[i] = rng.choice([NEG_INF, round(rng.uniform(-80, 10), 1)])
+    levels = list(mixer.sends)
+    results = {'values': len(levels), 'numpy': np is not None}
+
+    def timed(fn):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            out = fn()
+        return (time.perf_counter() - start) / repeats * 1e6, out
+
+    results['legacy_us'], texts = timed(
+        lambda: [legacy_position_text(legacy_text_position(format_level(level))) for level in levels]
+    )
+    results['legacy_symmetric'] = texts == [format_level(level) for level in levels]
+    results['table_us'], back = timed(lambda: positions_to_levels(levels_to_positions(levels)))
+    results['table_symmetric'] = back == levels
+    if np is not None:
+        matrix = np.array(levels).reshape(len(mixer.input_ids), len(mixer.send_output_ids))
+        results['numpy_us'], back = timed(lambda: positions_to_levels(levels_to_positions(matrix)))
+        results['numpy_symmetric'] = back.ravel().tolist() == levels
+    return results
+
+
+def load_corpus(path=None):
+    # next to this file, not the working directory
+    if path is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reply_corpus.txt')
+    with open(path, 'r') as f:
+        return [
+            line.rstrip('\n').encode('ascii').decode('unicode_escape').encode('latin-1')
+            for line in f
+            if line.strip() and not line.startswith('#')
+        ]
+
+
+def legacy_parse(reply):
+    # the old text round trip: substitute control bytes, split strings, then
+    # convert the way RFader.set_value did
+    text = str(reply.replace(ACK, b'<ack>').replace(STX, b'<stx>'), 'ascii')
+    values = []
+    for res in text.split(';')[:-1]:
+        if res.count(',') == 3:
+            value = res.split(',')[-2]
+        else:
+            value = res.split(',')[-1].rstrip(';<ack>')
+        values.append(float('-inf') if value.lower() == 'inf' else float(value))
+    return values
+
+
+def bench_parser(repeats=200):
+    corpus = load_corpus()
+    for reply in corpus:
+        parse_reply(reply)
+    reply = synthetic_reply(500)
+    results = {}
+    start = time.perf_counter()
+    for _ in range(repeats):
+        legacy_parse(reply)
+    results['legacy_text_parse'] = 500 * repeats / (time.perf_counter() - start)
+    # cold: every frame new to the reply cache. repeat: the same values
+    # coming back, like polling an unchanged desk
+    start = time.perf_counter()
+    for _ in range(repeats):
+        REPLY_CACHE.clear()
+        parse_reply(reply)
+    results['typed_parse'] = 500 * repeats / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        parse_reply(reply)
+    results['typed_parse_repeat'] = 500 * repeats / (time.perf_counter() - start)
+    start = time.perf_counter()
+    frames = 0
+    for _ in range(repeats):
+        REPLY_CACHE.clear()
+        for reply in corpus:
+            frames += len(parse_reply(reply))
+    results['typed_parse_corpus'] = frames / (time.perf_counter() - start)
+    return results
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(proxy, latencies, wall):
+    return {
+        'round_trips': proxy.messages,
+        'bytes_out': proxy.bytes_in,
+        'bytes_in': proxy.bytes_out,
+        'samples': len(latencies),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'wall_ms': wall * 1000,
+    }
+
+
+def run_refreshes(proxy, worker, queries, repeats):
+    # what Main.refresh / SendsScene.refresh hand to the worker
+    proxy.reset_stats()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        replies = worker.submit_many(queries).result()
+        latencies.append(time.perf_counter() - begin)
+        assert None not in replies
+    result = summarize(proxy, latencies, time.perf_counter() - start)
+    result['round_trips'] /= repeats
+    result['queries'] = len(queries)
+    return result
+
+
+def run_fader_burst(proxy, worker, writes):
+    # RFader.send_command for a burst of releases across every output fader
+    proxy.reset_stats()
+    outputs = ['AX' + str(v) for v in range(1, 9)] + ['MX' + str(v) for v in range(1, 5)] + ['MAL']
+    latencies = []
+    futures = []
+    start = time.perf_counter()
+    for i in range(writes):
+        command = 'FDC:' + outputs[i % len(outputs)] + ',' + str(-(i % 80)) + '.0'
+        begin = time.perf_counter()
+        future = worker.submit(command)
+        future.add_done_callback(lambda f, begin=begin: latencies.append(time.perf_counter() - begin))
+        futures.append(future)
+    for future in futures:
+        future.result()
+    return summarize(proxy, latencies, time.perf_counter() - start)
+
+
+def run_write_preemption(proxy, worker, rtt, writes=8):
+    # fader releases while the prefetcher pulls the whole send matrix. with
+    # priorities a write only waits for the pipeline window in flight; fifo
+    # queues the refresh and the writes at the same priority, like the old
+    # single queue worker
+    # two passes over the matrix so the refresh outlasts the writes
+    queries = [query_for_key(key) for key in send_matrix_keys(MixerState())] * 2
+    results = {}
+    for name, refresh_priority, write_priority in (
+        ('fifo', VISIBLE, VISIBLE), ('priority', BACKGROUND, WRITE)
+    ):
+        proxy.reset_stats()
+        latencies = []
+        futures = []
+        start = time.perf_counter()
+        refresh = worker.submit_many(queries, priority=refresh_priority)
+        for i in range(writes):
+            time.sleep(rtt * 2)
+            begin = time.perf_counter()
+            future = worker.submit('FDC:AX1,' + str(-i) + '.0', priority=write_priority)
+            future.add_done_callback(lambda f, begin=begin: latencies.append(time.perf_counter() - begin))
+            futures.append(future)
+        for future in futures:
+            future.result()
+        assert None not in refresh.result()
+        result = summarize(proxy, latencies, time.perf_counter() - start)
+        result['queries'] = len(queries)
+        results[name] = result
+    # one window of batches ahead of the write, then the write itself
+    results['bound_ms'] = 3 * rtt * 1000
+    results['within_bound'] = results['priority']['p99_ms'] <= results['bound_ms']
+    return results
+
+
+def run_split_connections(proxy, rtt, writes=8, readers=1):
+    # mute toggles during a full send matrix refresh, on one shared
+    # connection and on a pool with its own connection for writes
+    queries = [query_for_key(key) for key in send_matrix_keys(MixerState())] * 2
+    results = {}
+    for name in ('shared', 'pool'):
+        worker = connected_worker(proxy, 0 if name == 'shared' else readers)
+        proxy.reset_stats()
+        latencies = []
+        start = time.perf_counter()
+        refresh = worker.submit_many(queries)
+        for i in range(writes):
+            # off the refresh's round trip rhythm, so toggles land mid window
+            time.sleep(rtt * 1.3)
+            begin = time.perf_counter()
+            worker.submit('MUC:AX1,' + str(i % 2)).result()
+            latencies.append(time.perf_counter() - begin)
+        assert None not in refresh.result()
+        results[name] = summarize(proxy, latencies, time.perf_counter() - start)
+        worker.stop()
+    return results
+
+
+def run_outage(proxy, writes=20, outage=1.0, keepalive=0.25):
+    # the connection drops while idle: how long until the keepalive notices,
+    # and whether fader moves made while it is down still reach the desk
+    worker = connected_worker(proxy, keepalive=keepalive)
+    coalescer = WriteCoalescer(worker)
+    proxy.down = True
+    proxy.drop_connections()
+    start = time.perf_counter()
+    while not worker.session.offline() and time.perf_counter() - start < 10:
+        time.sleep(0.005)
+    detected = time.perf_counter() - start
+    final = 'FDC:AX1,' + str(-writes) + '.0'
+    for i in range(writes):
+        coalescer.write('FDC:AX1', 'FDC:AX1,' + str(-i) + '.0', final=False)
+        time.sleep(outage / writes)
+        coalescer.pump()
+    coalescer.write('FDC:AX1', final, final=True)
+    proxy.down = False
+    start = time.perf_counter()
+    while proxy.last_command != final and time.perf_counter() - start < 30:
+        time.sleep(0.005)
+        coalescer.pump()
+    recovered = time.perf_counter() - start
+    worker.stop()
+    result = coalescer.stats()
+    result.update({
+        'detect_ms': detected * 1000,
+        'recover_ms': recovered * 1000,
+        'final_value_applied': proxy.model.levels['AX1'] == final.split(',')[1],
+        'reconnects': worker.session.metrics.snapshot()['reconnects'],
+    })
+    return result
+
+
+def run_multi_fader(proxy, rtt, faders=4, seconds=1.0, event_rate=60, width=128, height=600):
+    # one finger on each of several send faders, all moving at once through
+    # a TouchRouter. 'separate' gives every fader its own coalescer, so each
+    # write is its own round trip like before; 'shared' is one coalescer,
+    # which batches the writes that are ready together
+    outputs = ['AX' + str(v) for v in range(1, faders + 1)]
+    results = {}
+    for name in ('separate', 'shared'):
+        worker = connected_worker(proxy)
+        coalescers = [WriteCoalescer(worker) for _ in outputs]
+        if name == 'shared':
+            coalescers = [coalescers[0]] * faders
+        controls = []
+        for i, output in enumerate(outputs):
+            x = width * (i + 0.5)
+            write = lambda key, command, final, c=coalescers[i]: c.write(key, command, final)
+            controls.append(BenchFader(x - 10, height / 2 - 145, 20, 240, output, write))
+        index = HitIndex(width, 25)
+        for control in controls:
+            index.add(control, control.rect)
+        router = TouchRouter(index)
+        proxy.reset_stats()
+        points = [(width * (i + 0.5), height / 2 - 25) for i in range(faders)]
+        for touch_id, point in enumerate(points):
+            assert router.began(touch_id, point, point) is controls[touch_id]
+        events = int(seconds * event_rate)
+        for step in range(events):
+            for touch_id, (x, y) in enumerate(points):
+                # every finger on its own ramp, so a misrouted move shows up
+                point = (x, y - 100 + (step * (touch_id + 1)) % 200)
+                router.moved(touch_id, point, point)
+            time.sleep(1.0 / event_rate)
+            for coalescer in set(coalescers):
+                coalescer.pump()
+        released = time.perf_counter()
+        for touch_id, point in enumerate(points):
+            router.ended(touch_id, point, point)
+        expected = {output: control.level for output, control in zip(outputs, controls)}
+        while any(proxy.model.sends['I1', out][0] != level for out, level in expected.items()):
+            if time.perf_counter() - released > 10:
+                break
+            time.sleep(0.001)
+        release = time.perf_counter() - released
+        worker.stop()
+        result = {'writes': sum(c.sent for c in set(coalescers)), 'round_trips': proxy.messages}
+        result['writes_per_fader_s'] = result['writes'] / faders / seconds
+        result['release_ms'] = release * 1000
+        result['final_values_applied'] = all(
+            proxy.model.sends['I1', out][0] == level for out, level in expected.items()
+        )
+        results[name] = result
+    return results
+
+
+def run_scene_recall(proxy, changed=0.05):
+    # save a scene, mess the desk up, recall it. 'all' writes every value
+    # in the scene, 'diff' only what differs from the cached state; then
+    # recalling again, and after a few faders were moved. writes go through
+    # a WriteCoalescer like recall_scene sends them: the first on its own,
+    # the rest as one pipelined batch when it returns
+    worker = connected_worker(proxy)
+    mixer = MixerState()
+    queries = [query_for_key(key) for key in mixer.keys(SCENE_FIELDS)]
+    done = []
+    coalescer = WriteCoalescer(worker, on_done=done.extend)
+
+    def read_back():
+        for reply in worker.submit_many(queries).result():
+            mixer.apply_reply(reply)
+
+    def recall(writes):
+        proxy.reset_stats()
+        del done[:]
+        start = time.perf_counter()
+        for command in writes:
+            mixer.apply_write(command)
+            coalescer.write(write_control(command), command)
+        while len(done) < len(writes):
+            time.sleep(0.001)
+            worker.drain()
+        for command, reply in done:
+            mixer.write_done(command, is_ack(reply))
+        result = {
+            'writes': len(writes),
+            'round_trips': proxy.messages,
+            'wall_ms': (time.perf_counter() - start) * 1000,
+            'acked': all(is_ack(reply) for command, reply in done),
+        }
+        read_back()
+        result['applied'] = save_scene(mixer)['values'] == scene['values']
+        return result
+
+    read_back()
+    scene = save_scene(mixer)
+    results = {'values': len(scene['values'])}
+    proxy.model.randomize(1)
+    read_back()
+    # against an empty state every value in the scene is a write
+    results['all'] = recall(scene_writes(MixerState(), scene))
+    proxy.model.randomize(2)
+    read_back()
+    results['diff'] = recall(scene_writes(mixer, scene))
+    results['again'] = recall(scene_writes(mixer, scene))
+    rng = random.Random(0)
+    for ids in rng.sample(sorted(mixer.send_index), int(len(mixer.send_index) * changed)):
+        proxy.model.sends[ids][0] = '-20.0'
+    read_back()
+    results['few_moved'] = recall(scene_writes(mixer, scene))
+    worker.stop()
+    return results
+
+
+def run_suite(rtt=0.02, repeats=20, writes=1000, batch_size=16, window=4):
+    results = {}
+    with Emulator(latency=rtt, seed=0) as proxy:
+        worker = connected_worker(proxy, batch_size=batch_size, window=window)
+        results['main_refresh'] = run_refreshes(proxy, worker, main_refresh_queries(), repeats)
+        results['sends_refresh_32'] = run_refreshes(proxy, worker, sends_refresh_queries(), repeats)
+        results['fader_burst'] = run_fader_burst(proxy, worker, writes)
+        results['write_during_refresh'] = run_write_preemption(proxy, worker, rtt)
+        results['split_connections'] = run_split_connections(proxy, rtt)
+        results['outage'] = run_outage(proxy)
+        results['multi_fader'] = run_multi_fader(proxy, rtt)
+        results['scene_recall'] = run_scene_recall(proxy)
+        worker.stop()
+    return results
+
+
+def run_micro():
+    return {
+        'auth': bench_auth(),
+        'refresh': bench_refresh(),
+        'fader_drag': bench_fader_drag(),
+        'reader': bench_reader(),
+        'parser': bench_parser(),
+        'pipeline': bench_pipeline(),
+        'hit_index': bench_hit_index(),
+        'taper': bench_taper(),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark the protocol layer against VMixerEmulator')
+    parser.add_argument('--rtt', type=float, default=0.02, help='emulated round trip in seconds')
+    parser.add_argument('--repeats', type=int, default=20, help='refreshes per scenario')
+    parser.add_argument('--writes', type=int, default=1000, help='fader writes in the burst')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--window', type=int, default=4)
+    parser.add_argument('--micro', action='store_true', help='also run the micro benchmarks')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args()
+    report = {
+        'revision': git_revision(),
+        'config': vars(args).copy(),
+        'results': run_suite(args.rtt, args.repeats, args.writes, args.batch_size, args.window),
+    }
+    del report['config']['output']
+    if args.micro:
+        report['micro'] = run_micro()
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+import argparse
+import json
+import sys
+import time
+
+from VMixerProtocol import ProxySession
+from VMixerParser import format_level
+from VMixerState import MixerState, query_for_key, NAME, LEVEL, MUTE, SEND
+
+CONFIG_FILE = '.vmxproxypyipport'
+
+
+def load_config(path=CONFIG_FILE):
+    # the ip / port / password file VMixerChannelView saves
+    try:
+        with open(path, 'r') as f:
+            ip = f.readline().strip()
+            port = f.readline().strip()
+            password = f.readline().strip()
+    except OSError:
+        return '', 10000, ''
+    return ip, int(port) if port else 10000, password
+
+
+def json_value(value):
+    # levels as the proxy writes them ('INF', '-10.0'), so dumps stay valid JSON
+    if isinstance(value, float):
+        return format_level(value)
+    return value
+
+
+def reply_dict(query, reply):
+    if reply is None:
+        return {'query': query, 'error': 'no reply'}
+    result = {'query': query, 'cmd': reply.cmd, 'ids': list(reply.ids), 'value': json_value(reply.value)}
+    if reply.cmd == 'ERR':
+        result['error'] = reply.value
+    return result
+
+
+def read_commands(args):
+    # one command per '&' part: request_many batches them itself and
+    # expects exactly one reply for each command it is given
+    lines = list(args.commands)
+    if args.file:
+        with open(args.file, 'r') if args.file != '-' else sys.stdin as f:
+            lines += [line for line in f if not line.startswith('#')]
+    return [part.strip() for line in lines for part in line.split('&') if part.strip()]
+
+
+def cmd_get(session, args):
+    queries = read_commands(args)
+    results = [reply_dict(q, r) for q, r in zip(queries, session.request_many(queries))]
+    print(json.dumps(results, indent=args.indent))
+    return any('error' in result for result in results)
+
+
+def cmd_set(session, args):
+    commands = read_commands(args)
+    results = [reply_dict(c, r) for c, r in zip(commands, session.request_many(commands))]
+    print(json.dumps(results, indent=args.indent))
+    return any('error' in result or result['cmd'] != 'ACK' for result in results)
+
+
+def cmd_watch(session, args):
+    # one JSON line per value that changed since the last poll
+    queries = read_commands(args)
+    last = {}
+    polls = 0
+    try:
+        while not args.count or polls < args.count:
+            for query, reply in zip(queries, session.request_many(queries)):
+                result = reply_dict(query, reply)
+                value = result.get('value', result.get('error'))
+                if query not in last or last[query] != value:
+                    result['time'] = time.time()
+                    print(json.dumps(result), flush=True)
+                last[query] = value
+            polls += 1
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    return False
+
+
+def dump_state(session, mixer):
+    keys = mixer.keys()
+    failed = 0
+    for reply in session.request_many([query_for_key(key) for key in keys]):
+        if reply is None or reply.cmd == 'ERR':
+            failed += 1
+        else:
+            mixer.apply_reply(reply)
+    version = session.sendGetReply('VRQ')
+
+    def channel(ch):
+        return {
+            'name': mixer.get((NAME, (ch,))),
+            'level': json_value(mixer.get((LEVEL, (ch,)))),
+            'mute': mixer.get((MUTE, (ch,))),
+        }
+
+    inputs = {}
+    for ch in mixer.input_ids:
+        inputs[ch] = channel(ch)
+        inputs[ch]['sends'] = {
+            out: json_value(mixer.get((SEND, (ch, out)))) for out in mixer.send_output_ids
+        }
+    return {
+        'version': version.value if version is not None else None,
+        'time': time.time(),
+        'outputs': {ch: channel(ch) for ch in mixer.output_ids},
+        'inputs': inputs,
+        'failed': failed,
+    }
+
+
+def cmd_dump(session, args):
+    mixer = MixerState(args.inputs)
+    state = dump_state(session, mixer)
+    text = json.dumps(state, indent=args.indent)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return state['failed'] > 0
+
+
+def main(argv=None):
+    ip, port, password = load_config()
+    parser = argparse.ArgumentParser(description='talk to VMXProxyPy from the command line, output is JSON')
+    parser.add_argument('--host', default=ip, help='defaults to ' + CONFIG_FILE)
+    parser.add_argument('--port', type=int, default=port)
+    parser.add_argument('--password', default=password)
+    parser.add_argument('--timeout', type=float, default=5)
+    parser.add_argument('--indent', type=int, default=2)
+    commands = parser.add_subparsers(dest='action')
+    commands.required = True
+
+    get = commands.add_parser('get', help="queries, e.g. 'FDQ:AX1' 'AXQ:I3,AX2'")
+    get.add_argument('commands', nargs='*')
+    get.add_argument('-f', '--file', help="one query per line, '-' for stdin")
+    get.set_defaults(run=cmd_get)
+
+    put = commands.add_parser('set', help="writes, e.g. 'FDC:AX1,-10.0' 'MUC:AX2,1'")
+    put.add_argument('commands', nargs='*')
+    put.add_argument('-f', '--file', help="one command per line, '-' for stdin")
+    put.set_defaults(run=cmd_set)
+
+    watch = commands.add_parser('watch', help='poll queries and print values as they change')
+    watch.add_argument('commands', nargs='*')
+    watch.add_argument('-f', '--file', help="one query per line, '-' for stdin")
+    watch.add_argument('--interval', type=float, default=1.0)
+    watch.add_argument('--count', type=int, default=0, help='stop after N polls')
+    watch.set_defaults(run=cmd_watch)
+
+    dump = commands.add_parser('dump', help='names, levels, mutes and sends of every channel')
+    dump.add_argument('--inputs', type=int, default=32)
+    dump.add_argument('--output', help='write here instead of stdout')
+    dump.set_defaults(run=cmd_dump)
+
+    args = parser.parse_args(argv)
+    session = ProxySession(args.host, args.port, args.password, args.timeout)
+    try:
+        session.refresh_socket()
+    except OSError as e:
+        print('could not connect to %s port %s: %s' % (args.host, args.port, e), file=sys.stderr)
+        return 2
+    try:
+        return 1 if args.run(session, args) else 0
+    finally:
+        session.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
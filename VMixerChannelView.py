@@ -1,41 +1,147 @@
-import socket
+import os
 import sys
 import time
 import random
 from scene import *
 from ui import Path
-from dialogs import form_dialog
+from dialogs import form_dialog, list_dialog, input_alert
 import sound
+from VMixerProtocol import (
+    ProxySession, WorkerPool, WriteCoalescer, AuthError, InvalidResponseError,
+    is_write, is_ack, VISIBLE, BACKGROUND
+)
+from VMixerTaper import LEVEL_TEXTS, POSITIONS, level_index, position_text, text_position
+from VMixerSync import SendMatrixPrefetcher, ChangePoller, QueryBudget
+from VMixerTouch import HitIndex, TouchRouter
+from VMixerState import (
+    MixerState, CachePolicy, key_for_query, query_for_key, load_snapshot, save_snapshot,
+    save_scene, scene_writes, write_control, NAME, LEVEL, MUTE, SEND
+)
 
 DEBUG = False
 VERBOSE = 2
+BATCH_SIZE = 16
+# how many batched messages may be in flight before waiting on replies
+PIPELINE_WINDOW = 4
+# connections for refreshes and polling, on top of the one for writes
+READ_CONNECTIONS = 1
+# seconds of idle before each connection is checked with a VRQ
+KEEPALIVE_INTERVAL = 5
+# send fader values while dragging, at most MAX_FADER_RATE writes/s per fader
+LIVE_FADER_UPDATES = True
+MAX_FADER_RATE = 20
+# show per-command stats from session.metrics in the title bar
+SHOW_METRICS = False
+# seconds before a cached value is queried again on refresh, RESYNC ignores these
+CACHE_TTLS = {NAME: 300.0, LEVEL: 2.0, MUTE: 2.0, SEND: 5.0}
+# keep the whole send matrix warm in the background while the worker is idle
+PREFETCH_SENDS = True
+PREFETCH_CHUNK = 64
+PREFETCH_INTERVAL = 0.5
+# poll the controls for changes made at the desk or by other clients, on
+# screen strips every POLL_VISIBLE_INTERVAL s, the rest every
+# POLL_HIDDEN_INTERVAL s, backing off up to POLL_MAX_BACKOFF times while
+# nothing changes. polling and prefetching together never send more than
+# POLL_BUDGET queries/s
+AUTO_POLL = True
+POLL_BUDGET = 40
+POLL_VISIBLE_INTERVAL = 1.0
+POLL_HIDDEN_INTERVAL = 10.0
+POLL_MAX_BACKOFF = 8
+# ms per frame spent applying queued value changes to nodes, whatever is
+# left over is shown on the next frame
+DISPLAY_BUDGET_MS = 4
+# strips built either side of the visible ones on the sends page
+STRIP_MARGIN = 2
+# how far outside its frame a control is offered a touch, faders take
+# touches up to 25 points from the knob
+HIT_SLOP = 25
+# last known mixer state, shown at startup while the proxy is queried, saved
+# every SNAPSHOT_INTERVAL s and on exit. None to disable
+SNAPSHOT_FILE = '.vmxproxypysnapshot'
+SNAPSHOT_INTERVAL = 30
+# named scenes (levels, mutes and sends) saved and recalled from the
+# SCENES button, one JSON file each
+SCENE_DIR = 'scenes'
+SAVE_SCENE = 'save current as...'
 
 
-def get_text(res):
-    if res is None:
-        return None
-    return res.split('"')[1].strip()
+class ViewUpdates:
+    # value changes waiting to be shown, latest value per element, applied
+    # in arrival order by flush() from the scene's update()
+    def __init__(self, budget_ms=DISPLAY_BUDGET_MS):
+        self.budget = budget_ms / 1000
+        self.pending = {}
+        self.applied = 0
+        self.deferred_frames = 0
+    
+    def push(self, elem, value):
+        self.pending.pop(elem, None)
+        self.pending[elem] = value
+    
+    def discard(self, elem):
+        self.pending.pop(elem, None)
+    
+    def flush(self):
+        if not self.pending:
+            return 0
+        deadline = time.perf_counter() + self.budget
+        count = 0
+        while self.pending:
+            elem = next(iter(self.pending))
+            elem.show_value(self.pending.pop(elem))
+            count += 1
+            if time.perf_counter() > deadline:
+                break
+        self.applied += count
+        if self.pending:
+            self.deferred_frames += 1
+        return count
+    
+    def stats(self):
+        return {
+            'applied': self.applied,
+            'pending': len(self.pending),
+            'deferred_frames': self.deferred_frames,
+        }
 
 
-class ChannelName(ShapeNode):
+class QueuedDisplay:
+    # elements bound to a ViewUpdates show mixer changes on its next flush
+    updates = None
+    
+    def queue_value(self, value):
+        if self.updates is None:
+            self.show_value(value)
+        else:
+            self.updates.push(self, value)
+
+
+class ChannelName(QueuedDisplay, ShapeNode):
     def __init__(self, x_size, color, name, id, cmd, *args, **kwargs):
         # super is the label box
         super().__init__(Path.rect(0, 0, x_size, 50), *args, **kwargs)
         self.label_text = LabelNode(name, ('Monospace', 20), parent=self)
+        self.name = None
         self.update_label(color, name)
         self.id = id
         self.cmd = cmd
     
     def update_label(self, color, name):
+        # text and colours only change with the name, LabelNode text
+        # assignments re-render the label texture
+        if name is None or name == self.name:
+            return
         self.fill_color = {0:'#444'}[0]
         self.stroke_color = {0:'#222'}[0]
-        if name is None:
-            return
         self.name = name
         self.label_text.text = name
     
-    def update_me(self):
-        self.update_label(0, get_text(self.cmd('CNQ:' + self.id)))
+    def refresh_query(self):
+        return 'CNQ:' + self.id
+    
+    def show_value(self, name):
+        self.update_label(0, name)
 
 
 class DynamicLabel(ShapeNode):
@@ -48,12 +154,16 @@ class DynamicLabel(ShapeNode):
              **kwargs
         )
         self.label_text = LabelNode('0.0 db', ('Monospace', 10), parent=self)
+        self.text = '0.0'
     
     def set_text(self, text_value):
+        if text_value == self.text:
+            return
+        self.text = text_value
         self.label_text.text = text_value + ' db'
 
 
-class MyFader(ShapeNode):
+class MyFader(QueuedDisplay, ShapeNode):
     def __init__(self, *args, length=240, **kwargs):
         self.length = length
         super().__init__(Path.rounded_rect(0, 0, 20, self.length, 10), '#444', *args, **kwargs)
@@ -62,19 +172,23 @@ class MyFader(ShapeNode):
         self.knob_size = 25
         self.set_raw_value(0.0)
         self.dragging = False
+        self.live_updates = False
         
     def handle_touch_begin(self, pos, panel_pos):
         kx, ky = self.knob.point_from_scene(pos)
         if abs(kx) > 25:
-            return
+            return False
         if abs(ky) > 25:
-            return
+            return False
         self.dragging = True
+        return True
 
     def handle_touch_drag(self, pos, panel_pos):
         sx, sy = self.point_from_scene(pos)
         if self.dragging:
             self.update_value(sy)
+            if self.live_updates:
+                self.send_command(final=False)
         return self.dragging
     
     def handle_touch_ended(self, pos, panel_pos):
@@ -89,6 +203,9 @@ class MyFader(ShapeNode):
     def update_display(self):
         pass # intended to be implemented in a subclass
     
+    def send_command(self, final=True):
+        pass # intended to be implemented in a subclass
+    
     def update_value(self, y):
         y_adjusted = min(max(0, y + self.length / 2 - self.knob_size), self.length - self.knob_size)
         y_adjusted /= self.length - self.knob_size
@@ -103,20 +220,14 @@ class MyFader(ShapeNode):
         return self.value
         
     def set_raw_value(self, val):
+        if getattr(self, 'value', None) == val:
+            return
         self.value = val
         self.update_knob_pos()
 
 
-def get_float_as_str(res):
-    if res is None:
-        return None
-    if res.count(',') == 3:
-        return res.split(',')[-2]
-    return res.split(',')[-1].rstrip(';<ack>')
-
-
 class RFader(MyFader):
-    def __init__(self, id, action, *args, init_value='0.0', length=240, **kwargs):
+    def __init__(self, id, action, *args, init_value='0.0', length=240, write=None, **kwargs):
         super().__init__(*args, length=length, **kwargs)
         self.label = DynamicLabel(parent=self)
         self.label.position = (0, - self.path.bounds.height / 2 - 35)
@@ -124,23 +235,22 @@ class RFader(MyFader):
         self.command = 'FDC:' + str(id)
         self.query_command = 'FDQ:' + str(id)
         self.action = action
+        self.write = write
+        self.live_updates = write is not None and LIVE_FADER_UPDATES
         self.set_value(init_value)
         
-    def send_command(self):
+    def send_command(self, final=True):
         if self.command[:2] in {'MX', 'AX'}:
-            self.action(self.command + ',' + self.get_value() + ',C')
+            command = self.command + ',' + self.get_value() + ',C'
         else:
-            self.action(self.command + ',' + self.get_value())
+            command = self.command + ',' + self.get_value()
+        if self.write is not None:
+            self.write(self.command, command, final)
+        else:
+            self.action(command)
     
     def get_value(self):
-        value = self.get_raw_value()
-        if value < 0.02:
-            return 'INF'
-        temp_val = value - 0.02
-        temp_val /= 0.98
-        temp_val *= 90
-        temp_val -= 80
-        return '{:.1f}'.format(temp_val)
+        return position_text(self.get_raw_value())
         
     def update_display(self):
         value = self.get_value()
@@ -150,24 +260,32 @@ class RFader(MyFader):
         if val is None:
             return
         self.label.set_text(val)
-        if val.lower() == 'inf':
-            self.set_raw_value(0.0)
-            return
         if VERBOSE > 1: print(val)
-        f = float(val)
-        f += 80
-        f /= 90
-        f * 0.98
-        self.set_raw_value(f + 0.02)
+        self.set_raw_value(text_position(val))
+    
+    def refresh_query(self):
+        return self.query_command
     
-    def update_me(self):
-        self.set_value(get_float_as_str(self.action(self.query_command)))
+    def show_value(self, level):
+        # never yank the knob from under a finger, and skip no-op redraws
+        if self.dragging or level is None:
+            return
+        i = level_index(level)
+        if LEVEL_TEXTS[i] != self.label.text:
+            self.label.set_text(LEVEL_TEXTS[i])
+            self.set_raw_value(POSITIONS[i])
 
 
 class RSendFader(RFader):
     def __init__(self, alt_command, send_id, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.bind(self.id, send_id, alt_command)
+    
+    def bind(self, id, send_id, alt_command):
+        # point the fader at another input -> output send
+        self.id = id
         self.command = alt_command + str(self.id) + ',' + send_id
+        self.query_command = 'FDQ:' + str(self.id)
         if send_id[:2] == 'MX':
             self.query_command = 'MXQ:' + str(self.id) + ',' + send_id
         elif send_id[:2] == 'AX':
@@ -236,13 +354,16 @@ class HorizontalScrollBar(ScrollBar):
         return False
 
 
-class MyButton(ShapeNode):
+class MyButton(QueuedDisplay, ShapeNode):
     def __init__(self, label, action, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.button_text = LabelNode(label, font=('Monospace', 18), parent=self)
         self.button_held = False
         self.action = action
     
+    def refresh_query(self):
+        return None
+    
     # called for EVERY touch, not just ones in the area of the button
     def handle_touch_ended(self, pos, panel_pos):
         converted_pos = self.parent.point_from_scene(pos)
@@ -289,84 +410,182 @@ class MyButton(ShapeNode):
             Action.scale_to(1, 0.05)
         )
 
-def get_int_from_result(res):
-    if res is None:
-        return None
-    return int(res.split(',')[1].rstrip(';<ack>'))
-
-
 class MuteButton(MyButton):
     def update_me(self, set_value=None):
         if set_value is not None:
-            self.action_original(set_value + str(1 - self.state))
-        newState = get_int_from_result(self.action_original(self.refresh_command))
-        self.state = newState if newState is not None else 1 - self.state
+            newState = 1 - self.state
+            if self.write is not None:
+                # coalesced and replayed after an outage, like the faders
+                self.write(self.key, set_value + str(newState), True)
+            else:
+                self.action_original(set_value + str(newState))
+            self.set_state(newState)
+        self.action_original(self.refresh_command)
+    
+    def refresh_query(self):
+        return self.refresh_command
+    
+    def show_value(self, state):
+        if state is not None:
+            self.set_state(state)
+    
+    def set_state(self, state):
+        if state == self.state:
+            return
+        self.state = state
         self.button_text.text = ['Live', 'Muted'][self.state]
         self.color = ['#611', '#f11'][self.state]
         self.stroke_color = ['#300', '#600'][self.state]
     
-    def __init__(self, path, action, label, id, *args, **kwargs):
+    def __init__(self, path, action, label, id, *args, write=None, **kwargs):
         self.action_original = action
+        self.write = write
         super().__init__(label, self.update_me, path, '#611', '#300', *args, **kwargs)
-        self.command = 'MUC:' + str(id) + ','
-        self.refresh_command = 'MUQ:' + str(id)
+        self.bind(id)
         self.state = 0
+    
+    def bind(self, id):
+        self.key = 'MUC:' + str(id)
+        self.command = self.key + ','
+        self.refresh_command = 'MUQ:' + str(id)
 
 
 class SendsButton(MyButton):
     def __init__(self, action, path, id, *args, **kwargs):
         super().__init__('SENDS', action, path, '#f83', '#420', *args, **kwargs)
         self.command = id
-    
-    def update_me(self):
-        pass
 
 
 class ReloadButton(MyButton):
     def __init__(self, action, path, *args, **kwargs):
         super().__init__('RELOAD', action, path, '#f83', '#420', *args, **kwargs)
         self.command = ''
-    
-    def update_me(self):
-        pass
-    
+
+
+class ResyncButton(MyButton):
+    def __init__(self, action, path, *args, **kwargs):
+        super().__init__('RESYNC', action, path, '#f83', '#420', *args, **kwargs)
+        self.command = ''
+
+
+class ScenesButton(MyButton):
+    def __init__(self, action, path, *args, **kwargs):
+        super().__init__('SCENES', action, path, '#3a3', '#050', *args, **kwargs)
+        self.command = ''
+
 
 class ConfigButton(MyButton):
     def __init__(self, action, path, *args, **kwargs):
         super().__init__('Reconfigure', action, path, '#33f', '#007', *args, **kwargs)
         self.command = ''
-    
-    def update_me(self):
-        pass
 
 
-class AuthError(Exception):
-    pass
+def bind_elements(elements, mixer, updates=None):
+    # elements show whatever the mixer state says about their control,
+    # through updates when given
+    for elem in elements:
+        query = elem.refresh_query()
+        if query is not None:
+            elem.updates = updates
+            mixer.subscribe(key_for_query(query), elem.queue_value)
+
+
+def element_keys(elements):
+    keys = []
+    for elem in elements:
+        query = elem.refresh_query()
+        if query is not None:
+            keys.append(key_for_query(query))
+    return keys
+
+
+def visible_keys(elements, panel, width, strip_width):
+    # keys of the elements in strips that are at least partly on screen
+    left = -panel.position.x - strip_width / 2
+    right = left + width + strip_width
+    keys = []
+    for elem in elements:
+        query = elem.refresh_query()
+        if query is not None and left <= elem.position.x <= right:
+            keys.append(key_for_query(query))
+    return keys
+
+
+def index_touch_targets(router, elements, panel, column_width):
+    # controls on the scrolling panel go in the column index, the rest
+    # (title bar buttons) are offered every touch
+    index = HitIndex(column_width, HIT_SLOP)
+    fixed = []
+    for elem in elements:
+        if elem.parent is panel:
+            frame = elem.frame
+            index.add(elem, (frame.x, frame.y, frame.w, frame.h))
+        else:
+            fixed.append(elem)
+    router.index = index
+    router.fixed = fixed
+
+
+def send_page_keys(ch_ids, out_channel):
+    # every key a sends page shows, built or not
+    keys = []
+    for ch in ch_ids:
+        keys.append((NAME, (ch,)))
+        if out_channel[:2] == 'MA':
+            keys.append((MUTE, (ch,)))
+            keys.append((LEVEL, (ch,)))
+        else:
+            keys.append((SEND, (ch, out_channel)))
+    return keys
 
 
-class InvalidResponseError(Exception):
-    pass
+def refresh_elements(elements, batch_cmd, mixer, policy, force=False):
+    # whatever the mixer state already knows is shown straight away, values
+    # that are stale under the cache policy are also queried in '&' batches
+    # and come back through the state
+    by_key = {}
+    for elem in elements:
+        query = elem.refresh_query()
+        if query is not None:
+            by_key.setdefault(key_for_query(query), []).append(elem)
+    stale = policy.stale_keys(mixer, list(by_key), force)
+    for key, elems in by_key.items():
+        value = mixer.get(key)
+        if value is not None:
+            for elem in elems:
+                elem.queue_value(value)
+    if stale:
+        return batch_cmd([query_for_key(key) for key in stale])
 
 
 class Main(Scene):
     def __init__(self, *args, **kwargs):
-        self.sock = None
+        self.session = ProxySession(batch_size=BATCH_SIZE, window=PIPELINE_WINDOW)
+        self.worker = WorkerPool(self.session, READ_CONNECTIONS, KEEPALIVE_INTERVAL)
+        self.worker.start()
+        self.mixer = MixerState()
+        self.coalescer = WriteCoalescer(self.worker, MAX_FADER_RATE, self.writes_done)
+        self.view_updates = ViewUpdates(DISPLAY_BUDGET_MS)
+        # sends page strips, kept for the next time the page opens
+        self.send_strips = []
+        self.cache_policy = CachePolicy(CACHE_TTLS)
         try:
             with open('.vmxproxypyipport', 'r') as f:
                 self.ip = f.readline().strip()
                 self.port = f.readline().strip()
                 self.port = int(self.port) if self.port else 10000
                 self.password = f.readline().strip()
+            self.worker.configure(self.ip, self.port, self.password)
             if VERBOSE:
                 print('loaded sock params')
             if not DEBUG:
                 vrq_response = self.sendGetReply('VRQ')
                 if vrq_response is None:
                     raise ConnectionRefusedError()
-                if 'ERR' in vrq_response:
+                if vrq_response.cmd == 'ERR':
                     if VERBOSE: print('AUTH FAILED!')
                     raise AuthError()
-                elif 'VRS' not in vrq_response:
+                elif vrq_response.cmd != 'VRS':
                     if VERBOSE: print('invalid version response')
                     raise InvalidResponseError()
         except AuthError:
@@ -377,10 +596,10 @@ class Main(Scene):
                 try:
                     self.reconfigure()
                     vrq_response = self.sendGetReply('VRQ')
-                    if 'ERR' in vrq_response:
+                    if vrq_response.cmd == 'ERR':
                         print('AUTH FAILED!')
                         raise AuthException()
-                    elif 'VRS' not in vrq_response:
+                    elif vrq_response.cmd != 'VRS':
                         if VERBOSE: print('invalid version response')
                         raise Exception()
                 except Exception as e:
@@ -403,10 +622,15 @@ class Main(Scene):
         self.ip = data['IP'] if data['IP'] else ''
         self.port = int(data['PORT']) if data['PORT'] else 10000
         self.password = data['password'] if data['password'] else ''
+        self.worker.configure(self.ip, self.port, self.password)
         if data['remember?']:
             with open('.vmxproxypyipport', 'w') as f:
                 f.write(self.ip + '\n' + str(self.port) + '\n' + self.password)
     
+    def change_proxy(self):
+        self.reconfigure()
+        self.resync()
+    
     def setup(self):
         self.ch_ids = (
             ['AX'+str(v) for v in range(1, 9)]
@@ -414,7 +638,9 @@ class Main(Scene):
             + ['MAL']
         )
         self.CHANNEL_COUNT = len(self.ch_ids) # 8 out, 4 mtx, main
-        self.cmd = self.send_command_stub if DEBUG else self.sendGetReply
+        self.cmd = self.send_command_stub if DEBUG else self.run_command
+        self.batch_cmd = self.batch_command_stub if DEBUG else self.run_commands
+        self.write_cmd = self.write_command_stub if DEBUG else self.write_command
         self.CHANNEL_SCREEN_WIDTH = 128
         self.MENU_HEIGHT = 60
         self.SCROLLBAR_HEIGHT = 30
@@ -435,15 +661,125 @@ class Main(Scene):
         self.all_noninteractive_elems = []
         self.all_ui_elements = []
         self.create_ui_elements()
-        self.dragging = False
+        self.touches = TouchRouter(None)
+        index_touch_targets(self.touches, self.all_ui_elements, self.panel, self.CHANNEL_SCREEN_WIDTH)
+        bind_elements(self.all_noninteractive_elems + self.all_ui_elements, self.mixer, self.view_updates)
+        # touch_id of the finger on the scroll bar, and of the one panning
+        self.scroll_touch = None
+        self.drag_touch = None
+        self.snapshot_saved = time.monotonic()
+        self.snapshot_mismatches = 0
+        self.restore_snapshot()
         self.refresh()
+        # polling and prefetching share one budget, polling goes first
+        self.query_budget = QueryBudget(POLL_BUDGET, BATCH_SIZE * 2)
+        self.prefetcher = None
+        if PREFETCH_SENDS and not DEBUG:
+            self.prefetcher = SendMatrixPrefetcher(
+                self.mixer,
+                self.cache_policy,
+                self.run_background,
+                PREFETCH_CHUNK,
+                PREFETCH_INTERVAL,
+                self.query_budget
+            )
+        self.poller = None
+        self.visible_x = None
+        if AUTO_POLL and not DEBUG:
+            self.poller = ChangePoller(
+                self.mixer,
+                self.run_background,
+                self.query_budget,
+                BATCH_SIZE * 2,
+                POLL_VISIBLE_INTERVAL,
+                POLL_HIDDEN_INTERVAL,
+                POLL_MAX_BACKOFF
+            )
+            self.poller.watch(element_keys(self.all_noninteractive_elems + self.all_ui_elements))
         
-    def refresh(self):
-        for elem in self.all_noninteractive_elems + self.all_ui_elements:
-            elem.update_me()
+    def proxy_id(self):
+        return [getattr(self, 'ip', ''), getattr(self, 'port', 10000)]
+    
+    def restore_snapshot(self):
+        # only a snapshot of the same proxy, every value in it is stale so
+        # the refresh after it queries it all again
+        if not SNAPSHOT_FILE or DEBUG:
+            return False
+        data = load_snapshot(SNAPSHOT_FILE)
+        if data is None or data.get('proxy') != self.proxy_id():
+            return False
+        restored = self.mixer.load(data)
+        if VERBOSE and restored:
+            print('restored snapshot', len(self.mixer.restored), 'values')
+        return restored
+    
+    def write_snapshot(self):
+        if not SNAPSHOT_FILE or DEBUG:
+            return None
+        data = self.mixer.dump()
+        data['proxy'] = self.proxy_id()
+        self.snapshot_saved = time.monotonic()
+        return self.worker.run(save_snapshot, SNAPSHOT_FILE, data, priority=BACKGROUND)
+    
+    def refresh(self, force=False):
+        refresh_elements(
+            self.all_noninteractive_elems + self.all_ui_elements,
+            self.batch_cmd,
+            self.mixer,
+            self.cache_policy,
+            force
+        )
         if self.sends_scene is not None:
-            self.sends_scene.refresh()
+            self.sends_scene.refresh(force)
+    
+    def resync(self):
+        self.refresh(force=True)
         
+    def scene_path(self, name):
+        return os.path.join(SCENE_DIR, name.replace('/', '-') + '.json')
+    
+    def scene_names(self):
+        try:
+            files = os.listdir(SCENE_DIR)
+        except OSError:
+            return []
+        return sorted(f[:-5] for f in files if f.endswith('.json'))
+    
+    def scenes_menu(self):
+        choice = list_dialog('Scenes', [SAVE_SCENE] + self.scene_names())
+        if choice is None:
+            return
+        if choice != SAVE_SCENE:
+            self.recall_scene(choice)
+            return
+        try:
+            name = input_alert('Save scene', 'name', '', 'Save').strip()
+        except KeyboardInterrupt:
+            return
+        if name:
+            self.save_scene(name)
+    
+    def save_scene(self, name):
+        os.makedirs(SCENE_DIR, exist_ok=True)
+        scene = save_scene(self.mixer)
+        scene['name'] = name
+        return self.worker.run(save_snapshot, self.scene_path(name), scene, priority=BACKGROUND)
+    
+    def recall_scene(self, name):
+        # only what differs from the mixer state goes out, through the
+        # coalescer as pipelined write batches, so recalling a scene that is
+        # mostly in place costs next to nothing and writes lost to an
+        # outage are sent again
+        scene = load_snapshot(self.scene_path(name))
+        if scene is None:
+            if VERBOSE: print('no scene', name)
+            return None
+        writes = scene_writes(self.mixer, scene)
+        if VERBOSE: print('recall', name, len(writes), 'changes')
+        for command in writes:
+            self.write_command(write_control(command), command)
+        return len(writes)
+    
     def create_ui_elements(self):
         # title bar
         self.title_bar = ShapeNode(
@@ -464,12 +800,36 @@ class Main(Scene):
         )
         self.all_ui_elements.append(self.reload_button)
         self.configure_proxy_button = ConfigButton(
-            lambda x: self.reconfigure(),
+            lambda x: self.change_proxy(),
             Path.rect(0, 0, 120, 40),
             parent=self.title_bar,
             position=(300, 30)
         )
         self.all_ui_elements.append(self.configure_proxy_button)
+        self.resync_button = ResyncButton(
+            lambda x: self.resync(),
+            Path.rect(0, 0, 120, 40),
+            parent=self.title_bar,
+            position=(450, 30)
+        )
+        self.all_ui_elements.append(self.resync_button)
+        self.scenes_button = ScenesButton(
+            lambda x: self.scenes_menu(),
+            Path.rect(0, 0, 120, 40),
+            parent=self.title_bar,
+            position=(600, 30)
+        )
+        self.all_ui_elements.append(self.scenes_button)
+        self.metrics_label = None
+        if SHOW_METRICS:
+            self.metrics_label = LabelNode(
+                '',
+                ('Monospace', 10),
+                parent=self.title_bar,
+                position=(680, 30),
+                anchor_point=(0, 0.5)
+            )
+            self.metrics_updated = 0
         # main panel
         self.panel = ShapeNode(
             Path.rect(0, 0, self.panel_width, self.panel_height),
@@ -514,6 +874,7 @@ class Main(Scene):
                 channel_id,
                 self.cmd,
                 init_value='0.0',
+                write=self.write_cmd,
                 length=240 if self.bounds.height >= 600 else 120,
                 parent=self.panel,
                 position=(
@@ -528,6 +889,7 @@ class Main(Scene):
                     self.cmd,
                     'Live',
                     channel_id,
+                    write=self.write_cmd,
                     parent=self.panel,
                     position=((r+0.5) * self.CHANNEL_SCREEN_WIDTH, self.panel_height - 110)
                 )
@@ -562,20 +924,16 @@ class Main(Scene):
     
     def touch_ended(self, touch):
         pos = touch.location
-        has_interacted = False
-        if self.scroll.handle_touch_ended_safe(pos):
-            self.update_scroll_pos()
-            has_interacted = True
+        if touch.touch_id == self.scroll_touch:
+            self.scroll_touch = None
+            if self.scroll.handle_touch_ended_safe(pos):
+                self.update_scroll_pos()
             return
         pos_panel = self.panel.point_from_scene(pos)
-        for elem in self.all_ui_elements:
-            has_interacted = (has_interacted or
-                elem.handle_touch_ended(pos, pos_panel)
-            )
-        if has_interacted:
+        if self.touches.ended(touch.touch_id, pos, pos_panel) is not None:
             return True
-        if self.dragging:
-            self.dragging = False
+        if touch.touch_id == self.drag_touch:
+            self.drag_touch = None
             bounded_pos = max(
                 -(self.panel_width - self.bounds.width), 
                 min(0, self.panel.position.x)
@@ -594,120 +952,204 @@ class Main(Scene):
     
     def touch_moved(self, touch):
         pos = touch.location
-        has_interacted = False
-        #if pos[1] >= self.bounds.height - SCROLLBAR_HEIGHT:
-        if self.scroll.handle_touch_drag_safe(pos):
-            self.update_scroll_pos()
-            has_interacted = True
+        if touch.touch_id == self.scroll_touch:
+            if self.scroll.handle_touch_drag_safe(pos):
+                self.update_scroll_pos()
             return
         pos_panel = self.panel.point_from_scene(pos)
-        for elem in self.all_ui_elements:
-            has_interacted = (has_interacted or
-                elem.handle_touch_drag(pos, pos_panel)
-            )
-        if has_interacted:
+        if self.touches.moved(touch.touch_id, pos, pos_panel) is not None:
             return
-        if self.dragging:
+        if touch.touch_id == self.drag_touch:
             dx = touch.location[0] - touch.prev_location[0]
             self.panel.run_action(Action.move_by(dx, 0, 0))
             self.mirror_scroll_pos()
     
     def touch_began(self, touch):
+        # every touch is owned by one thing until it ends: the scroll bar,
+        # the control it began on, or the panel. other fingers can work
+        # other faders meanwhile, but only one at a time scrolls
         pos = touch.location
-        has_interacted = False
         if pos[1] <= self.SCROLLBAR_HEIGHT:
-            self.scroll.handle_touch_begin_safe(pos)
-            has_interacted = True
+            if self.scroll_touch is None:
+                self.scroll_touch = touch.touch_id
+                self.scroll.handle_touch_begin_safe(pos)
             return
         pos_panel = self.panel.point_from_scene(pos)
-        for elem in self.all_ui_elements:
-            has_interacted = (has_interacted or
-                elem.handle_touch_begin(pos, pos_panel)
-            )
-        if has_interacted:
+        if self.touches.began(touch.touch_id, pos, pos_panel) is not None:
            return
-        self.dragging = True
-        
-    def get_channel_volumes(self, chids):
-        query = self.get_channel_volume_query
-        return self.get_multiple_results(chids, query)
+        if self.drag_touch is None:
+            self.drag_touch = touch.touch_id
         
-    def get_channel_names(self, chids):
-        return self.get_multiple_results(chids, self.get_channel_name_query)
-        
-    def get_multiple_results(self, chids, query):
-        results = query(chids)
-        if not isinstance(results, str):
-            return None
-        return results.split(';')[:-1]    
+    def send_command_stub(self, command, on_reply=None):
+        print(command)
     
-    def get_channel_volume_query(self, chid):
-        if isinstance(chid, list):
-            chid = '&FDQ:'.join(chid)
-        return self.cmd('FDQ:' + chid)
-
-    def get_channel_name_query(self, chid):
-        if isinstance(chid, list):
-            chid = '&CNQ:'.join(chid)
-        return self.cmd('CNQ:' + chid)
+    def batch_command_stub(self, commands, on_replies=None):
+        print('&'.join(commands))
     
-    def send_command_stub(self, command):
+    def write_command_stub(self, key, command, final=True):
         print(command)
     
-    def refresh_socket(self):
-        # Create a TCP/IP socket
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    def run_command(self, command, on_reply=None):
+        # writes land in the mixer state straight away, replies once they arrive
+        self.mixer.apply_write(command)
+        sent = time.monotonic()
         
-        # Connect the socket to the port where the server is listening
-        server_address = (self.ip, self.port)
-        if VERBOSE: print('connecting to %s port %s' % server_address)
+        def apply_reply(reply):
+            if is_write(command):
+                self.mixer.write_done(command, is_ack(reply))
+            self.mixer.apply_reply(reply, sent=sent)
+            if on_reply is not None:
+                on_reply(reply)
         
-        self.sock.settimeout(5)
-        self.sock.connect(server_address)
-        self.sock.settimeout(None)
+        return self.worker.submit(command, apply_reply)
+    
+    def run_commands(self, commands, on_replies=None, priority=VISIBLE):
+        for command in commands:
+            self.mixer.apply_write(command)
+        sent = time.monotonic()
         
-    def sendGetReply(self, command):
-        try:
-            if self.sock is None:
-                    self.refresh_socket()
-            if self.password.strip():
-                pwd_command = chr(2) + '###PWD:' + self.password + ';'
-                try:
-                    self.sock.settimeout(5)
-                    self.sock.sendall(bytes(pwd_command, 'ascii'))
-                    self.sock.settimeout(None)
-                except socket.error:
-                    self.refresh_socket()
-                    self.sock.settimeout(5)
-                    self.sock.sendall(bytes(pwd_command, 'ascii'))
-                    self.sock.settimeout(None)
-                reply = b''
-                while reply.count(b'"') < 2:
-                    self.sock.settimeout(5)
-                    reply += self.sock.recv(64)
-                    self.sock.settimeout(None)
-            expected_results = command.count('&') + 1
-            reply = b''
-            message = chr(2) + command + ';'
-            if VERBOSE: print(message)
-            self.sock.sendall(bytes(message, 'ascii'))
-            while reply.count(b';') < expected_results and reply[-1:] != b'\x06':
-                self.sock.settimeout(5)
-                reply += self.sock.recv(64)
-                self.sock.settimeout(None)
-        except Exception as e:
-            if VERBOSE: print(e)
-            self.sock = None
-            reply = None
+        def apply_replies(replies):
+            for command, reply in zip(commands, replies):
+                if is_write(command):
+                    self.mixer.write_done(command, is_ack(reply))
+                self.mixer.apply_reply(reply, sent=sent)
+            if on_replies is not None:
+                on_replies(replies)
+        
+        return self.worker.submit_many(commands, apply_replies, priority)
     
-        if reply:
-            reply = reply.replace(bytes(chr(6), 'ascii'), b"<ack>")
-            reply = reply.replace(bytes(chr(2), 'ascii'), b"<stx>")
-            reply = str(reply, 'ascii')
+    def run_background(self, commands, on_replies=None):
+        # prefetch traffic, steps aside for writes and on screen refreshes
+        return self.run_commands(commands, on_replies, BACKGROUND)
+    
+    def write_command(self, key, command, final=True):
+        self.mixer.apply_write(command)
+        self.coalescer.write(key, command, final)
+    
+    def writes_done(self, done):
+        for command, reply in done:
+            if VERBOSE and not is_ack(reply): print('write failed', command, reply)
+            self.mixer.write_done(command, is_ack(reply))
+    
+    def refresh_socket(self):
+        return self.worker.connect()
         
-        if VERBOSE: print(reply)
+    def sendGetReply(self, command):
+        # blocks until the worker has the reply, only for use outside the UI
+        return self.worker.call(command)
     
-        return reply
+    def visible_keys(self):
+        # only recomputed when the panel has scrolled
+        if self.panel.position.x != self.visible_x:
+            self.visible_x = self.panel.position.x
+            self.visible = visible_keys(
+                self.all_noninteractive_elems + self.all_ui_elements,
+                self.panel,
+                self.bounds.width,
+                self.CHANNEL_SCREEN_WIDTH
+            )
+        return self.visible
+    
+    def service_io(self, scene=None):
+        # once per frame, from whichever scene is on screen
+        self.coalescer.pump()
+        self.worker.drain()
+        if self.mixer.mismatched:
+            # the desk changed since the snapshot was taken
+            self.snapshot_mismatches += len(self.mixer.mismatched)
+            if VERBOSE: print('snapshot out of date:', self.mixer.mismatched)
+            del self.mixer.mismatched[:]
+        if time.monotonic() - self.snapshot_saved > SNAPSHOT_INTERVAL:
+            self.write_snapshot()
+        if self.poller is not None:
+            self.poller.set_visible((scene or self).visible_keys())
+            self.poller.tick(self.worker.idle() and not self.coalescer.pending)
+        if self.prefetcher is not None:
+            self.prefetcher.tick(self.worker.idle() and not self.coalescer.pending)
+        self.view_updates.flush()
+    
+    def update(self):
+        self.service_io()
+        if self.metrics_label is not None and self.t - self.metrics_updated > 1:
+            # re-rendering the label is not free, once a second is plenty
+            self.metrics_updated = self.t
+            self.metrics_label.text = '\n'.join(self.session.metrics.summary(3))
+    
+    def stop(self):
+        if VERBOSE:
+            print('fader writes', self.coalescer.stats())
+            print('\n'.join(self.session.metrics.summary(10)))
+            print('connections', self.worker.health())
+            print('refresh cache', self.cache_policy.stats())
+            if self.poller is not None:
+                print('poller', self.poller.stats())
+            print('background queries', self.query_budget.spent)
+            print('view updates', self.view_updates.stats())
+            print('snapshot mismatches', self.snapshot_mismatches)
+        self.write_snapshot()
+        self.worker.stop()
+
+class SendStrip:
+    # name, mute (mains only) and send fader for one input of the sends
+    # page. pooled on Main and rebound to whichever input scrolls into view
+    def __init__(self, scene):
+        main = scene.parent_scene
+        self.index = None
+        self.length = 240 if scene.bounds.height >= 600 else 120
+        self.name = ChannelName(main.CHANNEL_SCREEN_WIDTH * 7 / 8, 0, '', 'I1', scene.cmd)
+        self.mute = MuteButton(Path.rect(0, 0, 60, 60), scene.cmd, 'Live', 'I1', write=main.write_cmd)
+        self.fader = RSendFader(
+            'FDC:', 'MAL', 'I1', scene.cmd,
+            init_value='0.0', write=main.write_cmd, length=self.length
+        )
+        self.show_mute = False
+    
+    def elements(self):
+        if self.show_mute:
+            return [self.name, self.mute, self.fader]
+        return [self.name, self.fader]
+    
+    def attach(self, panel):
+        for node in (self.name, self.mute, self.fader):
+            node.remove_from_parent()
+        panel.add_child(self.name)
+        panel.add_child(self.fader)
+        self.show_mute = False
+        self.index = None
+    
+    def unbind(self, mixer, updates):
+        for elem in self.elements():
+            mixer.unsubscribe(key_for_query(elem.refresh_query()), elem.queue_value)
+            updates.discard(elem)
+        self.index = None
+    
+    def bind(self, scene, r, channel_id):
+        main = scene.parent_scene
+        mixer = main.mixer
+        out = scene.out_channel
+        x = main.CHANNEL_SCREEN_WIDTH * (r + 0.5)
+        self.index = r
+        self.name.id = channel_id
+        self.name.position = (x, scene.panel_height - 100)
+        if out[:2] == 'MA' and not self.show_mute:
+            scene.panel.add_child(self.mute)
+        elif out[:2] != 'MA' and self.show_mute:
+            self.mute.remove_from_parent()
+        self.show_mute = out[:2] == 'MA'
+        self.mute.bind(channel_id)
+        self.mute.position = (x, main.panel_height - 110)
+        self.fader.bind(
+            channel_id, out,
+            'FDC:' if out[:2] == 'MA' else 'AXC:' if out[:2] == 'AX' else 'MXC:'
+        )
+        self.fader.position = (x, scene.panel_height / 2 - 25)
+        # show what is known about the new input straight away
+        self.name.update_label(0, mixer.get((NAME, (channel_id,))) or 'IN ' + str(r + 1))
+        self.mute.set_state(mixer.get((MUTE, (channel_id,))) or 0)
+        level = mixer.get(key_for_query(self.fader.refresh_query()))
+        self.fader.show_value(level if level is not None else 0.0)
+        bind_elements(self.elements(), mixer, main.view_updates)
+
 
 class SendsScene(Scene):
     def __init__(self, parent_scene, ch_id, *args, **kwargs):
@@ -716,7 +1158,7 @@ class SendsScene(Scene):
         super().__init__(*args, **kwargs)
     
     def setup(self):
-        self.ch_ids = ['I'+str(i) for i in range(1, 33)]
+        self.ch_ids = list(self.parent_scene.mixer.input_ids)
         self.ch_count = len(self.ch_ids)
         self.panel_width = max(
             self.bounds.width,
@@ -725,12 +1167,30 @@ class SendsScene(Scene):
         self.panel_height = self.parent_scene.panel_height + self.parent_scene.MENU_HEIGHT
         self.background_color = self.parent_scene.background_color
         self.cmd = self.parent_scene.cmd
-        self.dragging = False
+        self.batch_cmd = self.parent_scene.batch_cmd
+        self.scroll_touch = None
+        self.drag_touch = None
+        self.visible_x = None
+        self.layout_x = None
         self.all_noninteractive_elems = []
-        self.all_ui_elements = [self.parent_scene.reload_button]
+        self.all_ui_elements = []
+        self.touches = TouchRouter(None)
         self.create_ui_elements()
+        self.keys = send_page_keys(self.ch_ids, self.out_channel)
+        if self.parent_scene.poller is not None:
+            self.parent_scene.poller.watch(self.keys)
+        self.layout_strips(refresh=False)
         self.refresh()
     
+    def close(self):
+        # stop polling this page, the prefetcher keeps the matrix warm
+        if self.parent_scene.poller is not None:
+            self.parent_scene.poller.unwatch(self.keys)
+        for strip in self.strips:
+            if strip.index is not None:
+                strip.unbind(self.parent_scene.mixer, self.parent_scene.view_updates)
+        self.dismiss_modal_scene()
+    
     def create_ui_elements(self):
         # main panel
         self.static_panel = ShapeNode(
@@ -757,6 +1217,13 @@ class SendsScene(Scene):
             position=(150, 30)
         )
         self.all_ui_elements.append(self.reload_button)
+        self.resync_button = ResyncButton(
+            lambda x: self.refresh(force=True),
+            Path.rect(0, 0, 120, 40),
+            parent=self.title_bar,
+            position=(300, 30)
+        )
+        self.all_ui_elements.append(self.resync_button)
         # not sure why, but need to fix a pixel on left on ipad
         self.panel = Node(
             position=(0, 0),
@@ -773,7 +1240,7 @@ class SendsScene(Scene):
         )
         # close button
         self.close_button = MyButton(
-            'X', lambda x:self.dismiss_modal_scene(),
+            'X', lambda x:self.close(),
             Path.rect(0, 0, 40, 40),
             '#F33',
             '#400',
@@ -781,71 +1248,88 @@ class SendsScene(Scene):
             position=(30, self.static_panel.path.bounds.height - 30)
         )
         self.close_button.command = None
-        # channel elements
-        for r, channel_id in enumerate(self.ch_ids):
-            # name tag
-            channel_name = "IN " + str(r + 1)
-            self.all_noninteractive_elems.append(
-                ChannelName(
-                    self.parent_scene.CHANNEL_SCREEN_WIDTH * 7 / 8,
-                    0,
-                    channel_name,
-                    channel_id,
-                    self.cmd,
-                    parent=self.panel,
-                    position=(
-                        self.parent_scene.CHANNEL_SCREEN_WIDTH * (r + 0.5),
-                        self.panel_height - 100
-                    )
-                )
-            )
-            if self.out_channel[:2] == 'MA':
-                mb = MuteButton(
-                    Path.rect(0, 0, 60, 60),
-                    self.cmd,
-                    'Live',
-                    channel_id,
-                    parent=self.panel,
-                    position=((r+0.5) * self.parent_scene.CHANNEL_SCREEN_WIDTH, self.parent_scene.panel_height - 110)
-                )
-                self.all_ui_elements.append(mb)
-            self.all_ui_elements.append(
-                RSendFader(
-                    'FDC:' if self.out_channel[:2] == 'MA' else
-                    'AXC:' if self.out_channel[:2] == 'AX' else
-                    'MXC:',
-                    self.out_channel,
-                    channel_id,
-                    self.cmd,
-                    init_value='0.0',
-                    length=240 if self.bounds.height >= 600 else 120,
-                    parent=self.panel,
-                    position=(
-                        self.parent_scene.CHANNEL_SCREEN_WIDTH * (r + 0.5),
-                        self.panel_height / 2 - 25
-                    )
-                )
-            )
+        self.all_ui_elements.append(self.close_button)
+        self.fixed_ui_elements = list(self.all_ui_elements)
+        # channel strips come from the pool on Main, built on demand
+        self.strips = self.parent_scene.send_strips
+        length = 240 if self.bounds.height >= 600 else 120
+        if self.strips and self.strips[0].length != length:
+            del self.strips[:]
+        for strip in self.strips:
+            strip.attach(self.panel)
     
-    def refresh(self):
-        for elem in self.all_noninteractive_elems + self.all_ui_elements:
-            elem.update_me()
+    def layout_strips(self, refresh=True):
+        # bind strips to the inputs in view plus STRIP_MARGIN either side,
+        # reusing strips that scrolled out. a fader being dragged keeps its input
+        width = self.parent_scene.CHANNEL_SCREEN_WIDTH
+        left = -self.panel.position.x
+        first = max(0, int(left // width) - STRIP_MARGIN)
+        last = min(self.ch_count, int((left + self.bounds.width) // width) + 1 + STRIP_MARGIN)
+        wanted = set(range(first, last))
+        bound = set()
+        free = []
+        for strip in self.strips:
+            if strip.index in wanted:
+                bound.add(strip.index)
+            elif not strip.fader.dragging:
+                free.append(strip)
+        added = []
+        for r in sorted(wanted - bound):
+            if free:
+                strip = free.pop()
+                if strip.index is not None:
+                    strip.unbind(self.parent_scene.mixer, self.parent_scene.view_updates)
+            else:
+                strip = SendStrip(self)
+                strip.attach(self.panel)
+                self.strips.append(strip)
+            strip.bind(self, r, self.ch_ids[r])
+            added.extend(strip.elements())
+        self.layout_x = self.panel.position.x
+        shown = sorted(
+            (strip for strip in self.strips if strip.index is not None),
+            key=lambda strip: strip.index
+        )
+        self.all_noninteractive_elems = [strip.name for strip in shown]
+        self.all_ui_elements = list(self.fixed_ui_elements)
+        for strip in shown:
+            self.all_ui_elements.extend(strip.elements()[1:])
+        index_touch_targets(
+            self.touches, self.all_ui_elements, self.panel, self.parent_scene.CHANNEL_SCREEN_WIDTH
+        )
+        if refresh and added:
+            refresh_elements(
+                added,
+                self.batch_cmd,
+                self.parent_scene.mixer,
+                self.parent_scene.cache_policy
+            )
     
-    def aux_send_query(self, chid):
-        temp = ',' + self.out_channel
-        if isinstance(chid, list):
-            chid = (temp + '&AXQ:').join(chid)
-        return self.cmd('AXQ:' + chid + temp)
+    def refresh(self, force=False):
+        refresh_elements(
+            self.all_noninteractive_elems + self.all_ui_elements,
+            self.batch_cmd,
+            self.parent_scene.mixer,
+            self.parent_scene.cache_policy,
+            force
+        )
     
-    def mtx_send_query(self, chid):
-        temp = ',' + self.out_channel
-        if isinstance(chid, list):
-            chid = (temp + '&MXQ:').join(chid)
-        return self.cmd('MXQ:' + chid + temp)
+    def visible_keys(self):
+        if self.panel.position.x != self.visible_x:
+            self.visible_x = self.panel.position.x
+            self.visible = visible_keys(
+                self.all_noninteractive_elems + self.all_ui_elements,
+                self.panel,
+                self.bounds.width,
+                self.parent_scene.CHANNEL_SCREEN_WIDTH
+            )
+        return self.visible
     
-    def get_channel_volumes(self, chids):
-        query = self.parent_scene.get_channel_volume_query
-        return self.parent_scene.get_multiple_results(chids, query)
+    def update(self):
+        if self.panel.position.x != self.layout_x:
+            self.layout_strips()
+        # the modal scene takes over the frame loop, keep applying replies
+        self.parent_scene.service_io(self)
     
     def mirror_scroll_pos(self):
         norm_pos = min(1,
@@ -863,22 +1347,16 @@ class SendsScene(Scene):
     
     def touch_ended(self, touch):
         pos = touch.location
-        has_interacted = self.close_button.handle_touch_ended(pos, pos)
-        if has_interacted:
-            return
-        if self.scroll.handle_touch_ended_safe(pos):
-            self.update_scroll_pos()
-            has_interacted = True
+        if touch.touch_id == self.scroll_touch:
+            self.scroll_touch = None
+            if self.scroll.handle_touch_ended_safe(pos):
+                self.update_scroll_pos()
             return
         pos_panel = self.panel.point_from_scene(pos)
-        for elem in self.all_ui_elements:
-            has_interacted = (has_interacted or
-                elem.handle_touch_ended(pos, pos_panel)
-            )
-        if has_interacted:
+        if self.touches.ended(touch.touch_id, pos, pos_panel) is not None:
             return True
-        if self.dragging:
-            self.dragging = False
+        if touch.touch_id == self.drag_touch:
+            self.drag_touch = None
             bounded_pos = max(
                 -(self.panel_width - self.bounds.width), 
                 min(0, self.panel.position.x)
@@ -897,43 +1375,31 @@ class SendsScene(Scene):
     
     def touch_moved(self, touch):
         pos = touch.location
-        has_interacted = self.close_button.handle_touch_drag(pos, pos)
-        if has_interacted:
-            return
-        #if pos[1] >= self.bounds.height - SCROLLBAR_HEIGHT:
-        if self.scroll.handle_touch_drag_safe(pos):
-            self.update_scroll_pos()
-            has_interacted = True
+        if touch.touch_id == self.scroll_touch:
+            if self.scroll.handle_touch_drag_safe(pos):
+                self.update_scroll_pos()
             return
         pos_panel = self.panel.point_from_scene(pos)
-        for elem in self.all_ui_elements:
-            has_interacted = (has_interacted or
-                elem.handle_touch_drag(pos, pos_panel)
-            )
-        if has_interacted:
+        if self.touches.moved(touch.touch_id, pos, pos_panel) is not None:
             return
-        if self.dragging:
+        if touch.touch_id == self.drag_touch:
             dx = touch.location[0] - touch.prev_location[0]
             self.panel.run_action(Action.move_by(dx, 0, 0))
             self.mirror_scroll_pos()
     
     def touch_began(self, touch):
+        # same ownership rules as Main.touch_began
         pos = touch.location
-        has_interacted = self.close_button.handle_touch_begin(pos, pos)
-        if has_interacted:
-            return
         if pos[1] <= self.parent_scene.SCROLLBAR_HEIGHT:
-            self.scroll.handle_touch_begin_safe(pos)
-            has_interacted = True
+            if self.scroll_touch is None:
+                self.scroll_touch = touch.touch_id
+                self.scroll.handle_touch_begin_safe(pos)
             return
         pos_panel = self.panel.point_from_scene(pos)
-        for elem in self.all_ui_elements:
-            has_interacted = (has_interacted or
-                elem.handle_touch_begin(pos, pos_panel)
-            )
-        if has_interacted:
+        if self.touches.began(touch.touch_id, pos, pos_panel) is not None:
            return
-        self.dragging = True
+        if self.drag_touch is None:
+            self.drag_touch = touch.touch_id
 
 class bcolors:
     HEADER = '\033[95m'
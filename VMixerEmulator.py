@@ -0,0 +1,246 @@
+import argparse
+import queue
+import random
+import socket
+import socketserver
+import threading
+import time
+
+from VMixerParser import STX, ACK, format_level, parse_level
+from VMixerState import INPUT_COUNT, OUTPUT_IDS, input_ids
+
+
+class MixerModel:
+    # in-memory console state, levels kept as the text the proxy sends
+    def __init__(self, inputs=INPUT_COUNT, seed=None):
+        self.input_ids = input_ids(inputs)
+        self.output_ids = list(OUTPUT_IDS)
+        channels = self.input_ids + self.output_ids
+        self.names = {ch: ch for ch in channels}
+        self.levels = {ch: '0.0' for ch in channels}
+        self.mutes = {ch: 0 for ch in channels}
+        self.sends = {
+            (ch, out): ['INF', 'C']
+            for ch in self.input_ids
+            for out in self.output_ids if out != 'MAL'
+        }
+        self.lock = threading.Lock()
+        if seed is not None:
+            self.randomize(seed)
+
+    def randomize(self, seed):
+        rng = random.Random(seed)
+        for ch in self.names:
+            self.levels[ch] = rng.choice(['INF', format_level(rng.uniform(-80, 10))])
+            self.mutes[ch] = rng.randint(0, 1)
+        for key in self.sends:
+            self.sends[key][0] = rng.choice(['INF', format_level(rng.uniform(-80, 10))])
+
+    def execute(self, command):
+        # one command without STX or ';', returns the reply bytes
+        cmd, _, args = command.partition(':')
+        args = args.split(',') if args else []
+        try:
+            with self.lock:
+                return getattr(self, 'do_' + cmd)(*args)
+        except (AttributeError, TypeError, KeyError, ValueError):
+            return STX + b'ERR:5;'
+
+    def reply(self, text):
+        return STX + bytes(text + ';', 'ascii')
+
+    def do_VRQ(self):
+        return self.reply('VRS:"VMXProxy emulator",1.00')
+
+    def do_CNQ(self, ch):
+        return self.reply('CNS:' + ch + ',"' + self.names[ch] + '"')
+
+    def do_FDQ(self, ch):
+        return self.reply('FDS:' + ch + ',' + self.levels[ch])
+
+    def do_FDC(self, ch, level):
+        self.levels[ch] = format_level(parse_level(level))
+        return ACK
+
+    def do_MUQ(self, ch):
+        return self.reply('MUS:' + ch + ',' + str(self.mutes[ch]))
+
+    def do_MUC(self, ch, state):
+        self.mutes[ch] = int(state)
+        return ACK
+
+    def do_AXQ(self, ch, out):
+        level, pan = self.sends[ch, out]
+        return self.reply('AXS:' + ch + ',' + out + ',' + level + ',' + pan)
+
+    def do_AXC(self, ch, out, level, pan='C'):
+        self.sends[ch, out] = [format_level(parse_level(level)), pan]
+        return ACK
+
+    def do_MXQ(self, ch, out):
+        return self.reply('MXS:' + ch + ',' + out + ',' + self.sends[ch, out][0])
+
+    def do_MXC(self, ch, out, level, pan='C'):
+        self.sends[ch, out][0] = format_level(parse_level(level))
+        return ACK
+
+
+class EmulatorHandler(socketserver.BaseRequestHandler):
+    # reads commands as they arrive and queues their replies on a writer
+    # thread that holds each one back by latency +- jitter, so pipelined
+    # commands overlap like they would on a real network
+    def handle(self):
+        server = self.server
+        if server.down:
+            return
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        server.connections += 1
+        server.active.add(self.request)
+        outgoing = queue.Queue()
+        writer = threading.Thread(target=self.write_replies, args=(outgoing,), daemon=True)
+        writer.start()
+        authenticated = not server.password
+        buffer = b''
+        last_due = 0.0
+        try:
+            while True:
+                try:
+                    data = self.request.recv(4096)
+                except OSError:
+                    return
+                if not data:
+                    return
+                server.bytes_in += len(data)
+                buffer += data
+                while b';' in buffer:
+                    frame, buffer = buffer.split(b';', 1)
+                    command = str(frame.lstrip(STX), 'ascii')
+                    server.messages += 1
+                    server.last_command = command
+                    if server.disconnect_rate and server.rng.random() < server.disconnect_rate:
+                        server.disconnects += 1
+                        return
+                    if command.startswith('###PWD:'):
+                        authenticated = not server.password or command[7:] == server.password
+                        reply = STX + (b'PWS:"OK";' if authenticated else b'ERR:"password";')
+                    elif not authenticated:
+                        reply = STX + b'ERR:0;'
+                    else:
+                        reply = b''.join(server.model.execute(part) for part in command.split('&'))
+                    due = time.perf_counter() + server.delay()
+                    last_due = max(last_due, due)
+                    outgoing.put((last_due, reply))
+        finally:
+            outgoing.put(None)
+            server.active.discard(self.request)
+            try:
+                self.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def write_replies(self, outgoing):
+        server = self.server
+        while True:
+            item = outgoing.get()
+            if item is None:
+                return
+            due, reply = item
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                for chunk in server.split(reply):
+                    self.request.sendall(chunk)
+            except OSError:
+                return
+            server.bytes_out += len(reply)
+
+
+class Emulator(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, password='', latency=0.0, jitter=0.0,
+                 split=0, disconnect_rate=0.0, inputs=INPUT_COUNT, seed=None):
+        super().__init__((host, port), EmulatorHandler)
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.split_size = split
+        self.disconnect_rate = disconnect_rate
+        self.rng = random.Random(seed)
+        self.model = MixerModel(inputs, seed)
+        # connections are closed straight after accept while down
+        self.down = False
+        self.active = set()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.messages = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.connections = 0
+        self.disconnects = 0
+        self.last_command = None
+
+    def drop_connections(self):
+        # like the proxy restarting or wifi dropping out
+        for sock in list(self.active):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def delay(self):
+        if not self.jitter:
+            return self.latency
+        return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+
+    def split(self, reply):
+        # split replies into random chunks of at most split_size bytes
+        if not self.split_size:
+            return [reply]
+        chunks = []
+        while reply:
+            size = self.rng.randint(1, self.split_size)
+            chunks.append(reply[:size])
+            reply = reply[size:]
+        return chunks
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='emulate VMXProxyPy for development and testing')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=10000)
+    parser.add_argument('--password', default='')
+    parser.add_argument('--latency', type=float, default=0.0, help='reply delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random +- added to latency')
+    parser.add_argument('--split', type=int, default=0, help='send replies in chunks of up to N bytes')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0,
+                        help='chance of dropping the connection on each command')
+    parser.add_argument('--inputs', type=int, default=INPUT_COUNT)
+    parser.add_argument('--seed', type=int, default=None, help='randomize mixer state')
+    args = parser.parse_args()
+    server = Emulator(
+        args.host, args.port, args.password, args.latency, args.jitter,
+        args.split, args.disconnect_rate, args.inputs, args.seed
+    )
+    print('emulating VMXProxyPy on %s port %s' % server.server_address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import threading
+from bisect import bisect_left
+
+# latency histogram bucket upper bounds in ms, the last bucket is overflow
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class CommandStats:
+    __slots__ = ('count', 'messages', 'errors', 'timeouts',
+                 'bytes_out', 'bytes_in', 'total', 'max', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.messages = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+
+    def percentile(self, pct):
+        # upper bound (ms) of the bucket holding the pct'th sample
+        target = self.messages * pct / 100
+        seen = 0
+        for bound, hits in zip(BUCKETS_MS, self.histogram):
+            seen += hits
+            if hits and seen >= target:
+                return bound
+        return self.max * 1000
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'messages': self.messages,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'bytes_out': self.bytes_out,
+            'bytes_in': self.bytes_in,
+            'total_ms': self.total * 1000,
+            'max_ms': self.max * 1000,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'histogram': list(self.histogram),
+        }
+
+
+def prefixes(command):
+    # '&' batches are counted under every command prefix they contain, with
+    # how many parts each has
+    if '&' not in command:
+        return {command[:3]: 1}
+    counts = {}
+    for part in command.split('&'):
+        counts[part[:3]] = counts.get(part[:3], 0) + 1
+    return counts
+
+
+class Metrics:
+    # per command prefix counters, recorded by ProxySession on the I/O
+    # thread and read with snapshot() from anywhere
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.commands = {}
+            self.reconnects = 0
+
+    def _stats(self, prefix):
+        stats = self.commands.get(prefix)
+        if stats is None:
+            stats = self.commands[prefix] = CommandStats()
+        return stats
+
+    def record(self, command, seconds, bytes_out, bytes_in):
+        # bytes and time of an '&' batch are shared out by part count, so
+        # the per prefix totals add up to what went over the wire. max and
+        # the histogram stay per message, the latency every part waited
+        bucket = bisect_left(BUCKETS_MS, seconds * 1000)
+        counts = prefixes(command)
+        parts = sum(counts.values())
+        left_out, left_in = bytes_out, bytes_in
+        with self.lock:
+            for i, (prefix, count) in enumerate(counts.items()):
+                stats = self._stats(prefix)
+                stats.count += count
+                stats.messages += 1
+                if i == len(counts) - 1:
+                    # the last prefix takes the rounding leftovers
+                    share_out, share_in = left_out, left_in
+                else:
+                    share_out = bytes_out * count // parts
+                    share_in = bytes_in * count // parts
+                left_out -= share_out
+                left_in -= share_in
+                stats.bytes_out += share_out
+                stats.bytes_in += share_in
+                stats.total += seconds * count / parts
+                if seconds > stats.max:
+                    stats.max = seconds
+                stats.histogram[bucket] += 1
+
+    def failure(self, command, timeout=False):
+        with self.lock:
+            for prefix in prefixes(command):
+                stats = self._stats(prefix)
+                stats.errors += 1
+                if timeout:
+                    stats.timeouts += 1
+
+    def reconnect(self):
+        with self.lock:
+            self.reconnects += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'reconnects': self.reconnects,
+                'commands': {prefix: stats.as_dict() for prefix, stats in self.commands.items()},
+            }
+
+    def summary(self, top=5):
+        # one line per prefix, slowest total time first
+        commands = self.snapshot()['commands']
+        ranked = sorted(commands.items(), key=lambda item: -item[1]['total_ms'])[:top]
+        return [
+            '{} n={} p95<{:.0f}ms err={}'.format(prefix, stats['count'], stats['p95_ms'], stats['errors'])
+            for prefix, stats in ranked
+        ]
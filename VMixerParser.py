@@ -0,0 +1,99 @@
+import re
+from collections import namedtuple
+
+STX = b'\x02'
+ACK = b'\x06'
+
+NEG_INF = float('-inf')
+
+# cmd is the reply type ('FDS', 'CNS', 'ACK', ...), ids a tuple of channel
+# ids and value a float (levels, -inf for INF), int (mutes) or str (names)
+Reply = namedtuple('Reply', 'cmd ids value')
+
+ACK_REPLY = Reply('ACK', (), None)
+
+# skips namedtuple's python level __new__, parsing makes a lot of these
+_new_reply = tuple.__new__
+
+# number of leading ids before the value in each reply type
+LEVEL_REPLIES = {'FDS': 1, 'AXS': 2, 'MXS': 2}
+INT_REPLIES = {'MUS': 1}
+
+FRAME_RE = re.compile('\x06|[^;\x06]*;')
+# level texts parse_level reads as INF
+INF_TEXTS = ('INF', 'inf', 'Inf')
+# parsed replies by frame text. polling gets the same frames back again and
+# again, and a hit skips building the Reply (most of the cost, with the
+# garbage collector work that comes with it). cleared when full
+REPLY_CACHE = {}
+REPLY_CACHE_SIZE = 8192
+
+
+def parse_level(text):
+    if text[-3:].upper() == 'INF':
+        return NEG_INF
+    return float(text)
+
+
+def format_level(value):
+    if value == NEG_INF:
+        return 'INF'
+    return '{:.1f}'.format(value)
+
+
+def parse_text(frame):
+    # one decoded reply, with or without its STX prefix and ';' terminator
+    reply = REPLY_CACHE.get(frame)
+    if reply is None:
+        if len(REPLY_CACHE) >= REPLY_CACHE_SIZE:
+            REPLY_CACHE.clear()
+        reply = REPLY_CACHE[frame] = _parse_text(frame)
+    return reply
+
+
+def _parse_text(frame):
+    # FrameReader and parse_reply hand over bare 'CMD:args' frames, those
+    # skip the strip and partition
+    if frame[3:4] == ':':
+        cmd = frame[:3]
+        args = frame[4:-1] if frame[-1] == ';' else frame[4:]
+    elif frame == '\x06':
+        return ACK_REPLY
+    else:
+        cmd, _, args = frame.strip('\x02;').partition(':')
+    split = LEVEL_REPLIES.get(cmd)
+    if split is not None:
+        parts = args.split(',', split + 1)
+        value = parts[split]
+        return _new_reply(Reply, (
+            cmd, tuple(parts[:split]), NEG_INF if value[-3:] in INF_TEXTS else float(value)
+        ))
+    quote = args.find('"')
+    if quote >= 0:
+        ids = tuple(args[:quote].split(',')[:-1])
+        return _new_reply(Reply, (cmd, ids, args[quote + 1:args.rfind('"')].strip()))
+    parts = args.split(',')
+    if cmd in INT_REPLIES:
+        split = INT_REPLIES[cmd]
+        return _new_reply(Reply, (cmd, tuple(parts[:split]), int(parts[split])))
+    return _new_reply(Reply, (cmd, tuple(parts[:-1]), parts[-1]))
+
+
+def parse_frame(frame):
+    # frame is one reply as bytes without its ';' terminator, or a bare ACK
+    if frame == ACK:
+        return ACK_REPLY
+    return parse_text(str(frame, 'ascii'))
+
+
+def parse_reply(data):
+    # a whole (possibly '&' batched) reply as received from the proxy
+    text = str(data, 'ascii')
+    if '\x06' in text:
+        frames = FRAME_RE.findall(text)
+    elif text[:1] == '\x02' and text[-1:] == ';':
+        # one split on ';STX' leaves the bare frames
+        frames = text[1:-1].split(';\x02')
+    else:
+        frames = text.split(';')[:-1]
+    return [parse_text(frame) for frame in frames]
@@ -0,0 +1,635 @@
+import queue
+import socket
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from VMixerParser import STX, ACK, parse_frame
+from VMixerMetrics import Metrics
+
+VERBOSE = 0
+
+BATCH_SIZE = 16
+PIPELINE_WINDOW = 4
+MAX_WRITE_RATE = 20
+# seconds of idle before a VRQ checks the connection, and how long it may take
+KEEPALIVE_INTERVAL = 5
+KEEPALIVE_TIMEOUT = 2
+# background reconnect backoff, doubling from min to max seconds
+RECONNECT_MIN = 0.25
+RECONNECT_MAX = 8
+
+# IOWorker priorities, lower runs first
+WRITE = 0
+VISIBLE = 1
+BACKGROUND = 2
+
+
+class AuthError(Exception):
+    pass
+
+
+class InvalidResponseError(Exception):
+    pass
+
+
+class OfflineError(ConnectionError):
+    # refused without trying, the session is waiting out its reconnect backoff
+    pass
+
+
+class FrameReader:
+    # buffered reader for proxy replies. frames end in ';' (returned without
+    # the STX prefix and terminator) or are a bare ACK (returned as ACK).
+    # bytes after the last complete frame are kept for the next read
+    def __init__(self, sock=None, size=4096):
+        self.buffer = bytearray(size)
+        self.reset(sock)
+
+    def reset(self, sock=None):
+        self.sock = sock
+        self.bytes_in = 0
+        self.start = 0
+        self.end = 0
+        self.scanned = 0
+
+    def pending(self):
+        return self.end - self.start
+
+    def feed(self, data):
+        self._reserve(len(data))
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def _reserve(self, size):
+        if self.end + size <= len(self.buffer):
+            return
+        remaining = self.end - self.start
+        if self.start:
+            self.buffer[:remaining] = self.buffer[self.start:self.end]
+            self.scanned -= self.start
+            self.start = 0
+            self.end = remaining
+        while self.end + size > len(self.buffer):
+            self.buffer.extend(bytes(len(self.buffer)))
+
+    def _fill(self):
+        if self.sock is None:
+            raise ConnectionResetError('no connection')
+        self._reserve(1024)
+        with memoryview(self.buffer) as view:
+            received = self.sock.recv_into(view[self.end:])
+        if not received:
+            raise ConnectionResetError('proxy closed connection')
+        self.end += received
+        self.bytes_in += received
+
+    def next_frame(self):
+        # returns the next complete frame, or None without reading the socket
+        buf = self.buffer
+        scan = max(self.start, self.scanned)
+        semi = buf.find(b';', scan, self.end)
+        ack = buf.find(ACK, scan, semi if semi >= 0 else self.end)
+        if ack >= 0 and buf.find(STX, self.start, ack) < 0:
+            self.start = ack + 1
+            if self.start == self.end:
+                self.start = self.end = self.scanned = 0
+            return ACK
+        if semi < 0:
+            self.scanned = self.end
+            return None
+        frame = bytes(buf[self.start:semi]).lstrip(STX + ACK)
+        self.start = semi + 1
+        self.scanned = self.start
+        if self.start == self.end:
+            self.start = self.end = self.scanned = 0
+        return frame
+
+    def read_frame(self):
+        frame = self.next_frame()
+        while frame is None:
+            self._fill()
+            frame = self.next_frame()
+        return frame
+
+    def read_frames(self, count, stop_on_ack=True):
+        # like the old reply loop: stop after count frames, or early on a
+        # trailing ACK with nothing else waiting
+        frames = []
+        while len(frames) < count:
+            frames.append(self.read_frame())
+            if stop_on_ack and frames[-1] == ACK and not self.pending():
+                break
+        return frames
+
+    def read_quoted(self):
+        # the password reply is only known to contain a quoted string. the
+        # ';' or ACK after it can come in a later segment, so wait for that
+        # byte too (_fill may move the data, hence the offset)
+        while self.buffer.count(b'"', self.start, self.end) < 2:
+            self._fill()
+        first = self.buffer.find(b'"', self.start, self.end)
+        offset = self.buffer.find(b'"', first + 1, self.end) + 1 - self.start
+        while self.start + offset >= self.end:
+            self._fill()
+        stop = self.start + offset
+        if self.buffer[stop:stop + 1] in (b';', ACK):
+            stop += 1
+        reply = bytes(self.buffer[self.start:stop])
+        self.start = self.scanned = stop
+        return reply
+
+
+def encode_command(command):
+    return STX + bytes(command + ';', 'ascii')
+
+
+class ProxySession:
+    # one TCP connection to VMXProxyPy, authenticated once per connect
+    def __init__(self, ip='', port=10000, password='', timeout=5,
+                 batch_size=BATCH_SIZE, window=PIPELINE_WINDOW, metrics=None,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT):
+        self.sock = None
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.connects = 0
+        self.reader = FrameReader()
+        self.batch_size = batch_size
+        self.window = window
+        self.authenticated = False
+        self.round_trips = 0
+        self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.last_used = time.monotonic()
+        self.configure(ip, port, password)
+
+    def configure(self, ip, port, password):
+        self.close()
+        self.backoff = 0.0
+        self.retry_at = 0.0
+        self.ip = ip
+        self.port = port
+        self.password = password
+
+    def offline(self, now=None):
+        # true while waiting to reconnect after losing the connection
+        return self.retry_at > (time.monotonic() if now is None else now)
+
+    def connection_lost(self):
+        self.close()
+        self.backoff = min(max(self.backoff * 2, RECONNECT_MIN), RECONNECT_MAX)
+        self.retry_at = time.monotonic() + self.backoff
+        if VERBOSE: print('connection lost, retrying in %.2fs' % self.backoff)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.reader.reset()
+        self.authenticated = False
+
+    def refresh_socket(self):
+        self.close()
+        server_address = (self.ip, self.port)
+        if VERBOSE: print('connecting to %s port %s' % server_address)
+        self.sock = socket.create_connection(server_address, self.timeout)
+        if self.connects:
+            self.metrics.reconnect()
+        self.connects += 1
+        self.sock.settimeout(self.timeout)
+        # pipelined commands are small writes, don't let Nagle hold them back
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.reader.reset(self.sock)
+        self.authenticate()
+        self.backoff = 0.0
+        self.retry_at = 0.0
+        self.last_used = time.monotonic()
+
+    def reconnect(self):
+        try:
+            self.refresh_socket()
+        except Exception as e:
+            if VERBOSE: print(e)
+            self.connection_lost()
+            return False
+        return True
+
+    def ping(self):
+        # a cheap round trip on an idle connection, so a dead one is found
+        # here and not by the next user command
+        if self.sock is None:
+            return False
+        self.sock.settimeout(self.keepalive_timeout)
+        try:
+            return self.sendGetReply('VRQ') is not None
+        finally:
+            if self.sock is not None:
+                self.sock.settimeout(self.timeout)
+
+    def authenticate(self):
+        if self.password.strip():
+            pwd_command = STX + bytes('###PWD:' + self.password + ';', 'ascii')
+            self.sock.sendall(pwd_command)
+            self.reader.read_quoted()
+            self.round_trips += 1
+        self.authenticated = True
+
+    def send(self, message, retry=True):
+        # retry=False when replies are still owed on this socket: a new
+        # socket would never send them, so the caller has to fail instead
+        self.last_used = time.monotonic()
+        if self.sock is None or not self.authenticated:
+            if self.offline():
+                # fail fast between reconnect attempts
+                raise OfflineError('offline')
+            self.refresh_socket()
+            self.sock.sendall(message)
+            return
+        try:
+            self.sock.sendall(message)
+        except OSError:
+            if not retry:
+                raise
+            # socket went stale while idle, reconnect once and retry
+            self.refresh_socket()
+            self.sock.sendall(message)
+
+    def request(self, command):
+        expected_results = command.count('&') + 1
+        message = encode_command(command)
+        if VERBOSE: print(message)
+        start = time.perf_counter()
+        self.send(message)
+        received = self.reader.bytes_in
+        frames = self.reader.read_frames(expected_results)
+        self.round_trips += 1
+        self.metrics.record(
+            command, time.perf_counter() - start, len(message), self.reader.bytes_in - received
+        )
+        return frames
+
+    def sendGetReply(self, command):
+        # the first parsed Reply, or None if the connection failed
+        try:
+            frames = self.request(command)
+        except OfflineError:
+            # not a new failure, the backoff already covers it
+            return None
+        except Exception as e:
+            if VERBOSE: print(e)
+            self.metrics.failure(command, isinstance(e, socket.timeout))
+            self.connection_lost()
+            return None
+        reply = parse_frame(frames[0])
+        if VERBOSE: print(reply)
+        return reply
+
+    def pipeline(self, commands, window=None):
+        # write up to window commands before reading any reply, then match
+        # replies to commands in order. every '&' part must answer with
+        # exactly one frame (a reply or an ACK). returns a list of frame
+        # lists, with None for commands lost to a connection error
+        window = window or self.window
+        replies = []
+        pending = deque()
+        sent = 0
+        try:
+            while len(replies) < len(commands):
+                while sent < len(commands) and len(pending) < window:
+                    message = encode_command(commands[sent])
+                    self.send(message, retry=not pending)
+                    pending.append((commands[sent].count('&') + 1, time.perf_counter(), len(message)))
+                    sent += 1
+                expected_results, start, bytes_out = pending.popleft()
+                received = self.reader.bytes_in
+                replies.append(self.reader.read_frames(expected_results, stop_on_ack=False))
+                self.round_trips += 1
+                self.metrics.record(
+                    commands[len(replies) - 1], time.perf_counter() - start,
+                    bytes_out, self.reader.bytes_in - received
+                )
+        except OfflineError:
+            replies += [None] * (len(commands) - len(replies))
+        except Exception as e:
+            if VERBOSE: print(e)
+            self.metrics.failure(commands[len(replies)], isinstance(e, socket.timeout))
+            self.connection_lost()
+            replies += [None] * (len(commands) - len(replies))
+        return replies
+
+    def request_many(self, queries, batch_size=None):
+        # join queries with '&' into batches, pipeline the batches, and
+        # return one parsed Reply (or None) per query
+        batch_size = batch_size or self.batch_size
+        batches = [queries[start:start + batch_size] for start in range(0, len(queries), batch_size)]
+        results = []
+        for batch, frames in zip(batches, self.pipeline(['&'.join(batch) for batch in batches])):
+            replies = [parse_frame(frame) for frame in frames or ()]
+            replies += [None] * (len(batch) - len(replies))
+            results.extend(replies[:len(batch)])
+        return results
+
+
+def is_write(command):
+    return command[2:3] == 'C'
+
+
+def is_ack(reply):
+    return reply is not None and reply.cmd == 'ACK'
+
+
+class BulkQuery:
+    # a large request_many, run one pipelined window of batches per step so
+    # higher priority requests can run in between
+    UNFINISHED = object()
+
+    def __init__(self, session, commands):
+        self.session = session
+        self.commands = commands
+        self.results = []
+
+    def step(self):
+        start = len(self.results)
+        size = self.session.batch_size * self.session.window
+        self.results.extend(self.session.request_many(self.commands[start:start + size]))
+        if len(self.results) < len(self.commands):
+            return self.UNFINISHED
+        return self.results
+
+
+class IOWorker:
+    # owns the session on a background thread, so the scene never blocks on
+    # the network. requests run by priority (WRITE, VISIBLE, BACKGROUND),
+    # in order within a priority. callbacks are queued and run by drain() on
+    # the scene thread. while idle it pings the proxy every keepalive seconds
+    # and reconnects in the background after the connection is lost
+    def __init__(self, session, keepalive=KEEPALIVE_INTERVAL):
+        self.session = session
+        self.keepalive = keepalive
+        self.requests = queue.PriorityQueue()
+        self.order = itertools.count()
+        self.completed = queue.Queue()
+        self.thread = None
+        self.busy = False
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.requests.put((BACKGROUND + 1, next(self.order), None))
+            self.thread = None
+
+    def run(self, fn, *args, on_result=None, priority=VISIBLE, failed=None):
+        # if fn raises, on_result still gets called, with failed, so callers
+        # waiting on it (the poller's in_flight, say) aren't stuck for good
+        future = Future()
+        self.requests.put((priority, next(self.order), (fn, args, future, on_result, failed)))
+        return future
+
+    def submit(self, command, on_reply=None, priority=None):
+        if priority is None:
+            priority = WRITE if is_write(command) else VISIBLE
+        return self.run(self.session.sendGetReply, command, on_result=on_reply, priority=priority)
+
+    def submit_many(self, commands, on_replies=None, priority=VISIBLE):
+        bulk = BulkQuery(self.session, commands)
+        return self.run(bulk.step, on_result=on_replies, priority=priority, failed=[None] * len(commands))
+
+    def call(self, command):
+        return self.submit(command).result()
+
+    def idle(self):
+        return not self.busy and self.requests.empty()
+
+    def drain(self):
+        while True:
+            try:
+                callback, result = self.completed.get_nowait()
+            except queue.Empty:
+                return
+            callback(result)
+
+    def wait_time(self):
+        session = self.session
+        now = time.monotonic()
+        if session.retry_at:
+            return max(0.0, session.retry_at - now)
+        if session.sock is not None and self.keepalive:
+            return max(0.0, session.last_used + self.keepalive - now)
+        return None
+
+    def maintain(self):
+        session = self.session
+        self.busy = True
+        try:
+            if session.retry_at:
+                if not session.offline():
+                    session.reconnect()
+            elif session.sock is not None and time.monotonic() - session.last_used >= self.keepalive:
+                session.ping()
+        finally:
+            self.busy = False
+
+    def _run(self):
+        while True:
+            try:
+                priority, order, item = self.requests.get(timeout=self.wait_time())
+            except queue.Empty:
+                self.maintain()
+                continue
+            if item is None:
+                self.session.close()
+                return
+            fn, args, future, on_result, failed = item
+            self.busy = True
+            try:
+                result = fn(*args)
+            except Exception as e:
+                if VERBOSE: print(e)
+                future.set_exception(e)
+                if on_result is not None:
+                    self.completed.put((on_result, failed))
+                continue
+            finally:
+                self.busy = False
+            if result is BulkQuery.UNFINISHED:
+                # keep its place in line, behind anything more urgent
+                self.requests.put((priority, order, item))
+                continue
+            future.set_result(result)
+            if on_result is not None:
+                self.completed.put((on_result, result))
+
+
+class WorkerPool:
+    # one connection (and IOWorker) for user writes and readers more for
+    # refreshes and polling, each authenticating on its own, so a big sends
+    # refresh never sits in front of a mute toggle. stands in for a single
+    # IOWorker: WRITE priority goes to the write connection, everything
+    # else to the least loaded reader that is online
+    def __init__(self, session, readers=1, keepalive=KEEPALIVE_INTERVAL):
+        self.session = session
+        self.writer = IOWorker(session, keepalive)
+        self.readers = [
+            IOWorker(ProxySession(
+                session.ip, session.port, session.password, session.timeout,
+                session.batch_size, session.window, session.metrics, session.keepalive_timeout
+            ), keepalive)
+            for _ in range(max(1, readers))
+        ]
+        self.workers = [self.writer] + self.readers
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def configure(self, ip, port, password):
+        return [worker.run(worker.session.configure, ip, port, password) for worker in self.workers]
+
+    def connect(self):
+        return [worker.run(worker.session.refresh_socket) for worker in self.workers]
+
+    def worker_for(self, priority, command=None):
+        # a single query made while writes are outstanding follows them on
+        # the write connection, so it can't overtake them at the proxy
+        if priority == WRITE or (command is not None and not self.writer.idle()):
+            return self.writer
+        online = [worker for worker in self.readers if not worker.session.offline()] or self.readers
+        return min(online, key=lambda worker: worker.requests.qsize() + worker.busy)
+
+    def run(self, fn, *args, on_result=None, priority=VISIBLE, failed=None):
+        # fn must not touch a session, use configure / connect / submit for that
+        return self.worker_for(priority).run(fn, *args, on_result=on_result, priority=priority, failed=failed)
+
+    def submit(self, command, on_reply=None, priority=None):
+        if priority is None:
+            priority = WRITE if is_write(command) else VISIBLE
+        return self.worker_for(priority, command).submit(command, on_reply, priority)
+
+    def submit_many(self, commands, on_replies=None, priority=VISIBLE):
+        return self.worker_for(priority).submit_many(commands, on_replies, priority)
+
+    def call(self, command):
+        return self.submit(command).result()
+
+    def idle(self):
+        return all(worker.idle() for worker in self.workers)
+
+    def drain(self):
+        for worker in self.workers:
+            worker.drain()
+
+    def health(self):
+        return [
+            {
+                'role': 'write' if worker is self.writer else 'read',
+                'online': worker.session.sock is not None and not worker.session.offline(),
+                'connects': worker.session.connects,
+                'backoff': worker.session.backoff,
+                'queued': worker.requests.qsize(),
+            }
+            for worker in self.workers
+        ]
+
+
+class WriteCoalescer:
+    # one pending value per control, newer values replace it, and non-final
+    # values are rate limited. one message is in flight at a time: whatever
+    # is ready when it returns goes out next as one '&' batch, so several
+    # faders moving at once share round trips instead of queueing behind
+    # each other
+    def __init__(self, worker, max_rate=MAX_WRITE_RATE, on_done=None):
+        # on_done gets the (command, reply) pairs of writes that won't be
+        # sent again, on the scene thread
+        self.worker = worker
+        self.on_done = on_done
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.in_flight = set()
+        self.last_sent = {}
+        self.sent = 0
+        self.coalesced = 0
+        self.replayed = 0
+        self.batches = 0
+
+    def write(self, key, command, final=True):
+        with self.lock:
+            if key in self.pending:
+                self.coalesced += 1
+            self.pending[key] = (command, final)
+        self.pump()
+
+    def pump(self, now=None):
+        if not self.pending:
+            return
+        now = time.monotonic() if now is None else now
+        if self.worker.session.offline(now):
+            # held (and coalesced) until the worker has reconnected
+            return
+        ready = []
+        with self.lock:
+            if self.in_flight:
+                return
+            for key, (command, final) in list(self.pending.items()):
+                if not final and now - self.last_sent.get(key, -self.min_interval) < self.min_interval:
+                    continue
+                del self.pending[key]
+                self.in_flight.add(key)
+                self.last_sent[key] = now
+                self.sent += 1
+                ready.append((key, command))
+        if len(ready) == 1:
+            self.worker.run(self._send, *ready[0], on_result=self.on_done, priority=WRITE, failed=[])
+        elif ready:
+            self.batches += 1
+            self.worker.run(self._send_many, ready, on_result=self.on_done, priority=WRITE, failed=[])
+
+    def _send(self, key, command):
+        reply = None
+        try:
+            reply = self.worker.session.sendGetReply(command)
+        finally:
+            done = self._done([(key, command)], [reply])
+        return done
+
+    def _send_many(self, writes):
+        replies = [None] * len(writes)
+        try:
+            replies = self.worker.session.request_many([command for key, command in writes])
+        finally:
+            done = self._done(writes, replies)
+        return done
+
+    def _done(self, writes, replies):
+        done = []
+        with self.lock:
+            for (key, command), reply in zip(writes, replies):
+                self.in_flight.discard(key)
+                if reply is None and key not in self.pending:
+                    # lost with the connection, send again once it is back
+                    # unless a newer value has already replaced it
+                    self.pending[key] = (command, True)
+                    self.replayed += 1
+                else:
+                    done.append((command, reply))
+        self.pump()
+        return done
+
+    def stats(self):
+        return {
+            'sent': self.sent, 'coalesced': self.coalesced,
+            'replayed': self.replayed, 'batches': self.batches,
+        }
@@ -0,0 +1,367 @@
+import json
+import math
+import os
+import time
+import weakref
+from array import array
+
+from VMixerParser import parse_level, format_level
+
+INPUT_COUNT = 32
+OUTPUT_IDS = (
+    ['AX' + str(v) for v in range(1, 9)]
+    + ['MX' + str(v) for v in range(1, 5)]
+    + ['MAL']
+)
+SEND_OUTPUT_IDS = OUTPUT_IDS[:-1]
+
+NAME = 'name'
+LEVEL = 'level'
+MUTE = 'mute'
+SEND = 'send'
+
+# reply / query / write command prefixes for each field
+REPLY_FIELDS = {'CNS': NAME, 'FDS': LEVEL, 'MUS': MUTE, 'AXS': SEND, 'MXS': SEND}
+QUERY_FIELDS = {'CNQ': NAME, 'FDQ': LEVEL, 'MUQ': MUTE, 'AXQ': SEND, 'MXQ': SEND}
+WRITE_FIELDS = {'FDC': LEVEL, 'MUC': MUTE, 'AXC': SEND, 'MXC': SEND}
+
+UNKNOWN = float('nan')
+
+SNAPSHOT_VERSION = 1
+# what a scene recalls, names are left alone
+SCENE_FIELDS = (LEVEL, MUTE, SEND)
+
+
+def input_ids(count=INPUT_COUNT):
+    return ['I' + str(i) for i in range(1, count + 1)]
+
+
+def key_for_query(query):
+    # 'AXQ:I1,AX1' -> ('send', ('I1', 'AX1'))
+    field = QUERY_FIELDS.get(query[:3])
+    if field is None:
+        return None
+    return (field, tuple(query[4:].split(',')))
+
+
+def query_for_key(key):
+    field, ids = key
+    if field == SEND:
+        return ids[1][:2] + 'Q:' + ids[0] + ',' + ids[1]
+    return {NAME: 'CNQ:', LEVEL: 'FDQ:', MUTE: 'MUQ:'}[field] + ids[0]
+
+
+def write_for_key(key, value):
+    # ('send', ('I1', 'AX1')), -3.0 -> 'AXC:I1,AX1,-3.0,C', like the faders send it
+    field, ids = key
+    if field == MUTE:
+        return 'MUC:' + ids[0] + ',' + str(value)
+    if field == SEND:
+        return ids[1][:2] + 'C:' + ids[0] + ',' + ids[1] + ',' + format_level(value) + ',C'
+    return 'FDC:' + ids[0] + ',' + format_level(value)
+
+
+def write_control(command):
+    # 'AXC:I1,AX1,-3.0,C' -> 'AXC:I1,AX1', the coalescer key of the fader
+    # or button that sends it
+    key, value = parse_write(command)
+    return command[:4] + ','.join(key[1])
+
+
+def parse_write(command):
+    # 'AXC:I1,AX1,-3.0,C' -> (('send', ('I1', 'AX1')), -3.0)
+    field = WRITE_FIELDS.get(command[:3])
+    if field is None:
+        return None, None
+    args = command[4:].split(',')
+    if field == MUTE:
+        return (MUTE, (args[0],)), int(args[1])
+    if field == SEND:
+        return (SEND, (args[0], args[1])), parse_level(args[2])
+    return (LEVEL, (args[0],)), parse_level(args[1])
+
+
+class MixerState:
+    # UI independent copy of the console: names, levels and mutes for every
+    # output and input, and the input x output send matrix. values live in
+    # flat arrays, each with an array of update times for freshness checks.
+    # subscribers are held weakly so discarded scene nodes just drop off
+    __slots__ = (
+        'output_ids', 'input_ids', 'send_output_ids', 'channels', 'send_index',
+        'names', 'levels', 'mutes', 'sends', 'updated', 'subscribers',
+        'restored', 'mismatched', 'written', 'unacked', '__weakref__'
+    )
+
+    def __init__(self, inputs=INPUT_COUNT, outputs=OUTPUT_IDS):
+        self.output_ids = list(outputs)
+        self.input_ids = input_ids(inputs)
+        self.send_output_ids = [out for out in self.output_ids if out[:2] != 'MA']
+        channel_ids = self.output_ids + self.input_ids
+        self.channels = {ch: i for i, ch in enumerate(channel_ids)}
+        self.send_index = {
+            (ch, out): i * len(self.send_output_ids) + j
+            for i, ch in enumerate(self.input_ids)
+            for j, out in enumerate(self.send_output_ids)
+        }
+        self.names = [None] * len(channel_ids)
+        self.levels = array('d', [UNKNOWN]) * len(channel_ids)
+        self.mutes = array('b', [-1]) * len(channel_ids)
+        self.sends = array('d', [UNKNOWN]) * len(self.send_index)
+        self.updated = {
+            NAME: array('d', [0.0]) * len(channel_ids),
+            LEVEL: array('d', [0.0]) * len(channel_ids),
+            MUTE: array('d', [0.0]) * len(channel_ids),
+            SEND: array('d', [0.0]) * len(self.send_index),
+        }
+        self.subscribers = {}
+        # keys loaded from a snapshot and not yet confirmed by the proxy, and
+        # the ones the proxy disagreed with
+        self.restored = set()
+        self.mismatched = []
+        # last local write per key, and the last write command of keys
+        # the proxy hasn't answered yet, see apply_reply
+        self.written = {}
+        self.unacked = {}
+
+    def _slot(self, key):
+        field, ids = key
+        if field == SEND:
+            return field, self.send_index[ids]
+        return field, self.channels[ids[0]]
+
+    def get(self, key):
+        field, index = self._slot(key)
+        if field == NAME:
+            return self.names[index]
+        if field == MUTE:
+            value = self.mutes[index]
+            return None if value < 0 else value
+        value = (self.levels if field == LEVEL else self.sends)[index]
+        return None if math.isnan(value) else value
+
+    def age(self, key, now=None):
+        field, index = self._slot(key)
+        updated = self.updated[field][index]
+        if not updated:
+            return math.inf
+        return (time.monotonic() if now is None else now) - updated
+
+    def fresh(self, key, max_age, now=None):
+        return self.age(key, now) <= max_age
+
+    def set(self, key, value, now=None):
+        # store value and notify subscribers if it changed; returns changed
+        field, index = self._slot(key)
+        self.updated[field][index] = time.monotonic() if now is None else now
+        if field == NAME:
+            changed = self.names[index] != value
+            self.names[index] = value
+        elif field == MUTE:
+            changed = self.mutes[index] != value
+            self.mutes[index] = value
+        else:
+            values = self.levels if field == LEVEL else self.sends
+            changed = values[index] != value
+            values[index] = value
+        if key in self.restored:
+            self.restored.discard(key)
+            if changed:
+                self.mismatched.append(key)
+        if changed:
+            self.notify(key, value)
+        return changed
+
+    def has(self, key):
+        field, ids = key
+        if field == SEND:
+            return ids in self.send_index
+        return ids[0] in self.channels
+
+    def apply_reply(self, reply, now=None, sent=None):
+        # sent is when the query went out: a reply to a query sent before the
+        # last local write of its key may predate that write, so it is dropped.
+        # so is any reply while the write is unanswered, a read on another
+        # connection can get to the proxy first
+        if reply is None:
+            return False
+        field = REPLY_FIELDS.get(reply.cmd)
+        if field is None:
+            return False
+        key = (field, reply.ids)
+        if not self.has(key):
+            return False
+        if key in self.unacked:
+            return False
+        if sent is not None and self.written.get(key, -math.inf) > sent:
+            return False
+        return self.set(key, reply.value, now)
+
+    def apply_write(self, command, now=None):
+        # writes show up in the state straight away, before the proxy acks
+        key, value = parse_write(command)
+        if key is None or not self.has(key):
+            return False
+        self.restored.discard(key)
+        now = time.monotonic() if now is None else now
+        self.written[key] = now
+        self.unacked[key] = command
+        return self.set(key, value, now)
+
+    def write_done(self, command, acked=True):
+        # the proxy has answered command (or it was given up on); once that
+        # is the key's last write, reads of the key are applied again. a
+        # write that wasn't acked leaves the value unconfirmed, as if never
+        # updated, so the next refresh reads it and the next recall resends it
+        key, value = parse_write(command)
+        if self.unacked.get(key) == command:
+            del self.unacked[key]
+            if not acked:
+                field, index = self._slot(key)
+                self.updated[field][index] = 0.0
+
+    def keys(self, fields=(NAME, LEVEL, MUTE, SEND)):
+        channels = self.output_ids + self.input_ids
+        keys = [(field, (ch,)) for field in fields if field != SEND for ch in channels]
+        if SEND in fields:
+            keys.extend((SEND, ids) for ids in self.send_index)
+        return keys
+
+    def dump(self):
+        # known values only, unknown levels are NaN and mutes -1
+        return {
+            'version': SNAPSHOT_VERSION,
+            'outputs': list(self.output_ids),
+            'inputs': list(self.input_ids),
+            'names': list(self.names),
+            'levels': [round(v, 1) for v in self.levels],
+            'mutes': list(self.mutes),
+            'sends': [round(v, 1) for v in self.sends],
+        }
+
+    def load(self, data):
+        # values from dump(), marked as never updated so every cache policy
+        # treats them as stale and the next refresh reconciles them
+        if (
+            data.get('version') != SNAPSHOT_VERSION
+            or data.get('outputs') != self.output_ids
+            or data.get('inputs') != self.input_ids
+        ):
+            return False
+        values = {NAME: data['names'], LEVEL: data['levels'], MUTE: data['mutes'], SEND: data['sends']}
+        for key in self.keys():
+            field, ids = key
+            if field == SEND:
+                value = values[SEND][self.send_index[ids]]
+            else:
+                value = values[field][self.channels[ids[0]]]
+            if value is None or (field == MUTE and value == -1) or (field != NAME and math.isnan(value)):
+                continue
+            self.set(key, value, 0.0)
+            self.restored.add(key)
+        return True
+
+    def subscribe(self, key, callback):
+        ref = weakref.WeakMethod(callback) if hasattr(callback, '__self__') else weakref.ref(callback)
+        self.subscribers.setdefault(key, []).append(ref)
+
+    def unsubscribe(self, key, callback):
+        refs = self.subscribers.get(key, [])
+        refs[:] = [ref for ref in refs if ref() is not None and ref() != callback]
+
+    def notify(self, key, value):
+        refs = self.subscribers.get(key)
+        if not refs:
+            return
+        dead = False
+        for ref in list(refs):
+            callback = ref()
+            if callback is None:
+                dead = True
+            else:
+                callback(value)
+        if dead:
+            refs[:] = [ref for ref in refs if ref() is not None]
+
+
+def save_snapshot(path, data):
+    # written next to the file and renamed, so a crash never leaves half a snapshot
+    temp = path + '.tmp'
+    with open(temp, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(temp, path)
+
+
+def load_snapshot(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_scene(mixer):
+    # every known level, mute and send, keyed by the query that reads it
+    # back, so scene files can be read and edited by hand
+    values = {}
+    for key in mixer.keys(SCENE_FIELDS):
+        value = mixer.get(key)
+        if value is not None:
+            values[query_for_key(key)] = value if key[0] == MUTE else format_level(value)
+    return {'version': SNAPSHOT_VERSION, 'time': time.time(), 'values': values}
+
+
+def scene_writes(mixer, scene):
+    # only the writes that change something: keys whose cached value
+    # already matches are skipped, unknown or unconfirmed ones are always
+    # written
+    writes = []
+    for query, value in scene.get('values', {}).items():
+        key = key_for_query(query)
+        if key is None or key[0] not in SCENE_FIELDS or not mixer.has(key):
+            continue
+        if key[0] != MUTE:
+            value = parse_level(value)
+        if mixer.get(key) != value or mixer.age(key) == math.inf:
+            writes.append(write_for_key(key, value))
+    return writes
+
+
+# seconds a cached value stays fresh: names barely change during a service,
+# levels and mutes can be moved at the desk at any time
+DEFAULT_TTLS = {NAME: 300.0, LEVEL: 2.0, MUTE: 2.0, SEND: 5.0}
+
+
+class CachePolicy:
+    # decides which keys a refresh has to query, and counts what it saved
+    def __init__(self, ttls=None):
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.queried = 0
+        self.saved = 0
+        self.saved_by_field = {field: 0 for field in self.ttls}
+        self.last_queried = 0
+        self.last_saved = 0
+
+    def stale_keys(self, mixer, keys, force=False, now=None):
+        now = time.monotonic() if now is None else now
+        stale = []
+        for key in keys:
+            if force or not mixer.fresh(key, self.ttls[key[0]], now):
+                stale.append(key)
+            else:
+                self.saved_by_field[key[0]] += 1
+        self.last_queried = len(stale)
+        self.last_saved = len(keys) - len(stale)
+        self.queried += self.last_queried
+        self.saved += self.last_saved
+        return stale
+
+    def stats(self):
+        return {
+            'queried': self.queried,
+            'saved': self.saved,
+            'saved_by_field': dict(self.saved_by_field),
+            'last_queried': self.last_queried,
+            'last_saved': self.last_saved,
+        }
@@ -0,0 +1,220 @@
+import math
+import time
+
+from VMixerState import NAME, LEVEL, MUTE, SEND, query_for_key
+
+
+def send_matrix_keys(mixer):
+    # everything a sends page shows: input names, mutes and levels (mains
+    # sends) and every input -> aux / matrix send
+    keys = []
+    for ch in mixer.input_ids:
+        keys.append((NAME, (ch,)))
+        keys.append((MUTE, (ch,)))
+        keys.append((LEVEL, (ch,)))
+    for out in mixer.send_output_ids:
+        for ch in mixer.input_ids:
+            keys.append((SEND, (ch, out)))
+    return keys
+
+
+class QueryBudget:
+    # token bucket for background queries: rate queries/s on average, up to
+    # burst at once. shared by the poller and the prefetcher so together
+    # they stay under rate. available(now, reserve) holds back that many
+    # tokens for whoever asks without a reserve, which is how polling goes first
+    def __init__(self, rate=40, burst=32):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = None
+        self.spent = 0
+
+    def available(self, now, reserve=0):
+        if self.last is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        return max(0, int(self.tokens - reserve))
+
+    def take(self, count):
+        self.tokens -= count
+        self.spent += count
+
+
+class SendMatrixPrefetcher:
+    # warms and then keeps revalidating the send matrix in the background.
+    # tick() only sends a chunk when the I/O worker is idle, so it never
+    # holds up anything the user asked for. with a budget it only spends
+    # what polling leaves over
+    def __init__(self, mixer, policy, batch_cmd, chunk_size=32, interval=0.5, budget=None):
+        self.mixer = mixer
+        self.policy = policy
+        self.batch_cmd = batch_cmd
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self.budget = budget
+        self.keys = send_matrix_keys(mixer)
+        self.position = 0
+        self.in_flight = False
+        self.last_sent = -math.inf
+        self.warm = False
+        self.fetched = 0
+
+    def next_chunk(self, now, size):
+        chunk = []
+        for _ in range(len(self.keys)):
+            key = self.keys[self.position]
+            self.position += 1
+            if self.position == len(self.keys):
+                self.position = 0
+                self.warm = True
+            if not self.mixer.fresh(key, self.policy.ttls[key[0]], now):
+                chunk.append(key)
+                if len(chunk) == size:
+                    break
+        return chunk
+
+    def tick(self, idle, now=None):
+        now = time.monotonic() if now is None else now
+        if self.in_flight or not idle or now - self.last_sent < self.interval:
+            return False
+        size = self.chunk_size
+        if self.budget is not None:
+            size = min(size, self.budget.available(now, self.budget.burst / 2))
+            if size < 1:
+                return False
+        chunk = self.next_chunk(now, size)
+        if not chunk:
+            return False
+        if self.budget is not None:
+            self.budget.take(len(chunk))
+        self.in_flight = True
+        self.last_sent = now
+        self.fetched += len(chunk)
+        self.batch_cmd([query_for_key(key) for key in chunk], self.done)
+        return True
+
+    def done(self, replies):
+        self.in_flight = False
+
+
+class ChangePoller:
+    # picks up changes made at the desk or by other clients. every watched
+    # key has its own poll interval, starting at visible_interval while its
+    # strip is on screen and hidden_interval otherwise, doubling each time a
+    # poll finds nothing new (up to max_backoff times) and dropping back as
+    # soon as something changes. a token bucket keeps the total under budget
+    # queries/s, pass a QueryBudget to share it with the prefetcher. replies
+    # go through the mixer state, which only notifies on real changes, so
+    # unchanged values are never repainted
+    def __init__(self, mixer, batch_cmd, budget=40, batch_size=32,
+                 visible_interval=1.0, hidden_interval=10.0, max_backoff=8):
+        self.mixer = mixer
+        self.batch_cmd = batch_cmd
+        if not isinstance(budget, QueryBudget):
+            budget = QueryBudget(budget, batch_size)
+        self.budget = budget
+        self.batch_size = batch_size
+        self.visible_interval = visible_interval
+        self.hidden_interval = hidden_interval
+        self.max_backoff = max_backoff
+        # key -> [due, interval]
+        self.schedule = {}
+        self.visible = set()
+        self.in_flight = False
+        self.polled = 0
+        self.changed = 0
+        self.skipped = 0
+
+    def base_interval(self, key):
+        return self.visible_interval if key in self.visible else self.hidden_interval
+
+    def watch(self, keys, now=None):
+        now = time.monotonic() if now is None else now
+        for key in keys:
+            if key not in self.schedule:
+                self.schedule[key] = [now + self.base_interval(key), self.base_interval(key)]
+
+    def unwatch(self, keys):
+        for key in keys:
+            self.schedule.pop(key, None)
+            self.visible.discard(key)
+
+    def set_visible(self, keys, now=None):
+        # keys coming on screen are due within visible_interval, keys going
+        # off screen keep their due time but back off from hidden_interval
+        now = time.monotonic() if now is None else now
+        keys = set(keys)
+        if keys == self.visible:
+            return
+        shown = keys - self.visible
+        hidden = self.visible - keys
+        self.visible = keys
+        self.watch(shown, now)
+        for key in shown:
+            entry = self.schedule[key]
+            entry[1] = self.visible_interval
+            entry[0] = min(entry[0], now + self.visible_interval)
+        for key in hidden:
+            if key in self.schedule:
+                self.schedule[key][1] = self.hidden_interval
+
+    def due_keys(self, limit, now):
+        due = []
+        for key, entry in self.schedule.items():
+            if entry[0] > now:
+                continue
+            # anything refreshed since (RELOAD, prefetch, a write) counts as a poll
+            age = self.mixer.age(key, now)
+            if age < entry[1]:
+                entry[0] = now + entry[1] - age
+                self.skipped += 1
+                continue
+            due.append((entry[0], key))
+        due.sort()
+        return [key for _, key in due[:limit]]
+
+    def tick(self, idle, now=None):
+        now = time.monotonic() if now is None else now
+        tokens = min(self.batch_size, self.budget.available(now))
+        if self.in_flight or not idle or tokens < 1:
+            return False
+        keys = self.due_keys(tokens, now)
+        if not keys:
+            return False
+        self.budget.take(len(keys))
+        self.in_flight = True
+        self.polled += len(keys)
+        before = [self.mixer.get(key) for key in keys]
+        self.batch_cmd(
+            [query_for_key(key) for key in keys],
+            lambda replies: self.done(keys, before, replies)
+        )
+        return True
+
+    def done(self, keys, before, replies, now=None):
+        now = time.monotonic() if now is None else now
+        self.in_flight = False
+        for key, value, reply in zip(keys, before, replies):
+            entry = self.schedule.get(key)
+            if entry is None:
+                continue
+            base = self.base_interval(key)
+            if reply is None:
+                entry[0] = now + entry[1]
+            elif self.mixer.get(key) != value:
+                self.changed += 1
+                entry[1] = base
+                entry[0] = now + base
+            else:
+                entry[1] = min(entry[1] * 2, base * self.max_backoff)
+                entry[0] = now + entry[1]
+
+    def stats(self):
+        return {
+            'watched': len(self.schedule),
+            'visible': len(self.visible),
+            'polled': self.polled,
+            'changed': self.changed,
+            'skipped': self.skipped,
+        }
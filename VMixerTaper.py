@@ -0,0 +1,145 @@
+import math
+from array import array
+
+from VMixerParser import NEG_INF, parse_level
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# fader law as (dB, position) points, linear in dB between them. like a desk
+# fader most of the travel goes to the range around unity, and everything
+# below MIN_POSITION is INF
+CURVE = (
+    (-80.0, 0.02),
+    (-60.0, 0.10),
+    (-40.0, 0.25),
+    (-20.0, 0.50),
+    (-10.0, 0.70),
+    (0.0, 0.85),
+    (10.0, 1.0),
+)
+MIN_POSITION = CURVE[0][1]
+# levels are tenths of a dB, like the proxy sends them
+MIN_TENTHS = -800
+MAX_TENTHS = 100
+# slots in the position -> level lookup, finer than the closest two table
+# positions so a slot never skips one
+RESOLUTION = 8192
+
+
+def curve_position(level):
+    for (db0, pos0), (db1, pos1) in zip(CURVE, CURVE[1:]):
+        if level <= db1:
+            return pos0 + (level - db0) / (db1 - db0) * (pos1 - pos0)
+    return CURVE[-1][1]
+
+
+# index 0 is INF, then every tenth from MIN_TENTHS to MAX_TENTHS. the level
+# values are what parse_level gives for the text, so they compare equal
+LEVELS = [NEG_INF] + [tenths / 10 for tenths in range(MIN_TENTHS, MAX_TENTHS + 1)]
+LEVEL_TEXTS = ['INF'] + ['{:.1f}'.format(level) for level in LEVELS[1:]]
+TEXT_INDEX = {text: i for i, text in enumerate(LEVEL_TEXTS)}
+POSITIONS = array('d', [0.0] + [curve_position(level) for level in LEVELS[1:]])
+LAST = len(LEVELS) - 1
+
+_LEVEL_POSITIONS = dict(zip(LEVELS, POSITIONS))
+# the table position after each one, with a sentinel past the top
+_NEXT = array('d', list(POSITIONS[1:]) + [math.inf])
+# largest index whose position is at or below each slot's start
+_INVERSE = array('H')
+_i = 0
+for _slot in range(RESOLUTION + 1):
+    while _i < LAST and POSITIONS[_i + 1] <= _slot / RESOLUTION:
+        _i += 1
+    _INVERSE.append(_i)
+assert min(b - a for a, b in zip(POSITIONS, POSITIONS[1:])) > 1 / RESOLUTION
+del _i, _slot
+
+
+def level_index(level):
+    # NaN (unknown), INF and anything under -80 dB are INF, above +10 clamps
+    if not level >= MIN_TENTHS / 10 - 0.05:
+        return 0
+    return min(round(level * 10), MAX_TENTHS) - MIN_TENTHS + 1
+
+
+def position_index(position):
+    # nearest table position, so each table position maps back to itself
+    if position < MIN_POSITION:
+        return 0
+    i = _INVERSE[min(int(position * RESOLUTION), RESOLUTION)]
+    if _NEXT[i] <= position:
+        i += 1
+    if _NEXT[i] - position < position - POSITIONS[i]:
+        i += 1
+    return i
+
+
+def level_to_position(level):
+    return POSITIONS[level_index(level)]
+
+
+def position_to_level(position):
+    return LEVELS[position_index(position)]
+
+
+def position_text(position):
+    # 'INF' / '-10.0', as the proxy takes it
+    return LEVEL_TEXTS[position_index(position)]
+
+
+def text_position(text):
+    i = TEXT_INDEX.get(text)
+    if i is None:
+        i = level_index(parse_level(text))
+    return POSITIONS[i]
+
+
+if np is not None:
+    _np_levels = np.array(LEVELS)
+    _np_positions = np.array(POSITIONS)
+    _np_next = np.array(_NEXT)
+    _np_inverse = np.array(_INVERSE, dtype=np.intp)
+
+
+def levels_to_positions(levels):
+    # a row or matrix at once: numpy arrays of any shape give an array of
+    # the same shape, anything else a list
+    if np is not None and isinstance(levels, np.ndarray):
+        levels = levels.astype(float)
+        with np.errstate(invalid='ignore'):
+            known = levels >= MIN_TENTHS / 10 - 0.05
+        tenths = np.rint(np.where(known, levels, 0.0) * 10)
+        index = np.minimum(tenths, MAX_TENTHS).astype(np.intp) - MIN_TENTHS + 1
+        return _np_positions[np.where(known, index, 0)]
+    # table levels are a dict hit, the rest (NaN, out of range, not a
+    # whole tenth) go through level_index
+    known = _LEVEL_POSITIONS.get
+    positions = POSITIONS
+    return [known(level) or positions[level_index(level)] for level in levels]
+
+
+def positions_to_levels(positions):
+    if np is not None and isinstance(positions, np.ndarray):
+        positions = positions.astype(float)
+        slots = np.clip(positions * RESOLUTION, 0, RESOLUTION).astype(np.intp)
+        i = _np_inverse[slots]
+        i += _np_next[i] <= positions
+        i += _np_next[i] - positions < positions - _np_positions[i]
+        return _np_levels[np.where(positions < MIN_POSITION, 0, i)]
+    levels, table, after, inverse = LEVELS, POSITIONS, _NEXT, _INVERSE
+    result = []
+    for position in positions:
+        # position_index, inlined
+        if position < MIN_POSITION:
+            result.append(NEG_INF)
+            continue
+        i = inverse[min(int(position * RESOLUTION), RESOLUTION)]
+        if after[i] <= position:
+            i += 1
+        if after[i] - position < position - table[i]:
+            i += 1
+        result.append(levels[i])
+    return result
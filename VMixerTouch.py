@@ -0,0 +1,62 @@
+import math
+
+
+class HitIndex:
+    # panel controls bucketed by strip column, so a touch is only offered
+    # to the controls in its own column (and a neighbour's, for a control
+    # that reaches over the column edge). rects are panel coordinates
+    # (x, y, w, h) grown by slop on every side, the controls still do their
+    # own exact hit test
+    def __init__(self, column_width, slop=0):
+        self.column_width = column_width
+        self.slop = slop
+        self.columns = {}
+
+    def clear(self):
+        self.columns = {}
+
+    def add(self, elem, rect):
+        x, y, w, h = rect
+        left, right = x - self.slop, x + w + self.slop
+        entry = (left, y - self.slop, right, y + h + self.slop, elem)
+        for column in range(math.floor(left / self.column_width), math.floor(right / self.column_width) + 1):
+            self.columns.setdefault(column, []).append(entry)
+
+    def candidates(self, x, y):
+        return [
+            elem
+            for left, bottom, right, top, elem in self.columns.get(math.floor(x / self.column_width), ())
+            if left <= x <= right and bottom <= y <= top
+        ]
+
+
+class TouchRouter:
+    # a touch belongs to the first control that accepts its touch_began,
+    # and only that control sees its moves and its end. a control held by
+    # one finger is not offered to another, so each finger drives its own
+    def __init__(self, index, fixed=()):
+        self.index = index
+        self.fixed = list(fixed)
+        self.captured = {}
+
+    def began(self, touch_id, pos, panel_pos):
+        held = self.captured.values()
+        for elem in self.fixed + self.index.candidates(panel_pos[0], panel_pos[1]):
+            if elem in held:
+                continue
+            if elem.handle_touch_begin(pos, panel_pos):
+                self.captured[touch_id] = elem
+                return elem
+        return None
+
+    def moved(self, touch_id, pos, panel_pos):
+        elem = self.captured.get(touch_id)
+        if elem is not None:
+            elem.handle_touch_drag(pos, panel_pos)
+        return elem
+
+    def ended(self, touch_id, pos, panel_pos):
+        elem = self.captured.pop(touch_id, None)
+        if elem is not None:
+            elem.handle_touch_ended(pos, panel_pos)
+        return elem
@@ -0,0 +1,33 @@
+import contextlib
+import io
+import json
+import unittest
+
+import VMixerProtocol
+from VMixerCLI import main
+from VMixerEmulator import Emulator
+
+VMixerProtocol.VERBOSE = 0
+
+
+class GetTest(unittest.TestCase):
+    def setUp(self):
+        self.proxy = Emulator(seed=0).__enter__()
+        self.addCleanup(self.proxy.__exit__, None, None, None)
+
+    def get(self, *commands):
+        out = io.StringIO()
+        argv = ['--host', '127.0.0.1', '--port', str(self.proxy.server_address[1]), 'get']
+        with contextlib.redirect_stdout(out):
+            main(argv + list(commands))
+        return json.loads(out.getvalue())
+
+    def test_batched_queries_are_answered_one_by_one(self):
+        results = self.get('FDQ:AX1&MUQ:AX2', 'CNQ:AX3')
+        self.assertEqual([r['query'] for r in results], ['FDQ:AX1', 'MUQ:AX2', 'CNQ:AX3'])
+        self.assertEqual([r['cmd'] for r in results], ['FDS', 'MUS', 'CNS'])
+        self.assertEqual([r['ids'] for r in results], [['AX1'], ['AX2'], ['AX3']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from VMixerMetrics import Metrics
+
+
+class RecordTest(unittest.TestCase):
+    def test_batch_bytes_and_time_are_shared_by_part_count(self):
+        metrics = Metrics()
+        metrics.record('CNQ:I1&FDQ:I1&MUQ:I1&FDQ:I2', 0.04, 101, 203)
+        commands = metrics.snapshot()['commands']
+        self.assertEqual(sum(stats['bytes_out'] for stats in commands.values()), 101)
+        self.assertEqual(sum(stats['bytes_in'] for stats in commands.values()), 203)
+        self.assertAlmostEqual(sum(stats['total_ms'] for stats in commands.values()), 40.0)
+        self.assertEqual(commands['FDQ']['count'], 2)
+        self.assertEqual(commands['FDQ']['bytes_out'], 50)
+        self.assertAlmostEqual(commands['FDQ']['total_ms'], 20.0)
+        # every part still waited for the whole message
+        for stats in commands.values():
+            self.assertEqual(stats['messages'], 1)
+            self.assertAlmostEqual(stats['max_ms'], 40.0)
+
+    def test_single_command(self):
+        metrics = Metrics()
+        metrics.record('FDQ:AX1', 0.002, 9, 16)
+        stats = metrics.snapshot()['commands']['FDQ']
+        self.assertEqual((stats['count'], stats['bytes_out'], stats['bytes_in']), (1, 9, 16))
+
+
+if __name__ == '__main__':
+    unittest.main()
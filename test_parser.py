@@ -0,0 +1,64 @@
+import unittest
+
+from VMixerBenchmark import load_corpus
+from VMixerParser import Reply, REPLY_CACHE, NEG_INF, ACK_REPLY, parse_reply, parse_frame, parse_level, format_level
+
+# what each reply_corpus.txt line parses to, in file order
+EXPECTED = [
+    [Reply('VRS', (), 'M-480')],
+    [Reply('PWS', (), 'OK')],
+    [ACK_REPLY],
+    [Reply('ERR', (), '0')],
+    [Reply('ERR', (), '5')],
+    [Reply('CNS', ('AX1',), 'Foldback 1')],
+    [Reply('CNS', ('MX2',), 'Stream')],
+    [Reply('CNS', ('MAL',), 'Main')],
+    [Reply('CNS', ('I1',), 'Kick')],
+    [Reply('CNS', ('I32',), '')],
+    [Reply('FDS', ('AX1',), 0.0)],
+    [Reply('FDS', ('AX2',), -10.5)],
+    [Reply('FDS', ('AX3',), 10.0)],
+    [Reply('FDS', ('MAL',), NEG_INF)],
+    [Reply('FDS', ('I7',), NEG_INF)],
+    [Reply('MUS', ('AX1',), 0)],
+    [Reply('MUS', ('MX4',), 1)],
+    [Reply('AXS', ('I1', 'AX1'), -5.0)],
+    [Reply('AXS', ('I12', 'AX8'), NEG_INF)],
+    [Reply('AXS', ('I32', 'AX4'), 6.0)],
+    [Reply('MXS', ('I3', 'MX1'), -20.0)],
+    [Reply('MXS', ('I30', 'MX4'), NEG_INF)],
+    [Reply('FDS', ('AX1',), -3.0), Reply('FDS', ('AX2',), -6.0), Reply('FDS', ('AX3',), NEG_INF)],
+    [Reply('CNS', ('I1',), 'Kick'), Reply('AXS', ('I1', 'AX2'), -12.0), Reply('MUS', ('I1',), 0)],
+    [ACK_REPLY] * 3,
+    [Reply('FDS', ('AX1',), -3.0), ACK_REPLY, Reply('MUS', ('AX1',), 1)],
+    [ACK_REPLY, Reply('ERR', (), '5'), Reply('AXS', ('I2', 'AX1'), -1.0), ACK_REPLY],
+]
+
+
+class CorpusTest(unittest.TestCase):
+    def test_every_line_parses_as_expected(self):
+        corpus = load_corpus()
+        self.assertEqual(len(corpus), len(EXPECTED))
+        for data, expected in zip(corpus, EXPECTED):
+            REPLY_CACHE.clear()
+            self.assertEqual(parse_reply(data), expected, data)
+            # and the same again from the cache
+            self.assertEqual(parse_reply(data), expected, data)
+
+    def test_frames_parse_like_whole_replies(self):
+        # FrameReader hands over frames without STX and ';'
+        self.assertEqual(parse_frame(b'AXS:I12,AX8,INF,L50'), Reply('AXS', ('I12', 'AX8'), NEG_INF))
+        self.assertEqual(parse_frame(b'\x06'), ACK_REPLY)
+        self.assertEqual(parse_frame(b'ERR:5'), Reply('ERR', (), '5'))
+
+
+class LevelTest(unittest.TestCase):
+    def test_level_text_round_trip(self):
+        for text in ('INF', '-80.0', '-10.5', '-0.0', '0.0', '10.0'):
+            self.assertEqual(parse_level(format_level(parse_level(text))), parse_level(text))
+        self.assertEqual(parse_level('-INF'), NEG_INF)
+        self.assertEqual(format_level(NEG_INF), 'INF')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import time
+import unittest
+
+import VMixerProtocol
+from VMixerProtocol import FrameReader, ProxySession, WriteCoalescer, ACK, STX, BACKGROUND, RECONNECT_MAX
+from VMixerBenchmark import connected_worker, run_write_preemption, run_multi_fader
+from VMixerEmulator import Emulator
+
+VMixerProtocol.VERBOSE = 0
+
+# emulated round trip, slow enough that queueing behind a refresh shows
+RTT = 0.03
+
+
+class ChunkSocket:
+    # hands out the given byte strings one recv at a time, like TCP segments
+    def __init__(self, *chunks):
+        self.chunks = list(chunks)
+
+    def recv_into(self, view):
+        if not self.chunks:
+            return 0
+        # at most what fits, like recv_into; the rest stays for the next call
+        chunk = self.chunks[0][:len(view)]
+        self.chunks[0] = self.chunks[0][len(chunk):]
+        if not self.chunks[0]:
+            self.chunks.pop(0)
+        view[:len(chunk)] = chunk
+        return len(chunk)
+
+
+class FrameReaderTest(unittest.TestCase):
+    def test_password_reply_terminator_in_a_later_segment(self):
+        reader = FrameReader(ChunkSocket(STX + b'PWS:"OK"', b';' + STX + b'FDS:AX1,-10.0;'))
+        self.assertEqual(reader.read_quoted(), STX + b'PWS:"OK";')
+        self.assertEqual(reader.read_frames(1), [b'FDS:AX1,-10.0'])
+
+    def test_frame_split_across_segments(self):
+        reader = FrameReader(ChunkSocket(STX + b'FDS:A', b'X1,-1', b'0.0;'))
+        self.assertEqual(reader.read_frame(), b'FDS:AX1,-10.0')
+
+    def test_bare_ack(self):
+        reader = FrameReader(ChunkSocket(ACK + STX + b'MUS:AX1,1;'))
+        self.assertEqual(reader.read_frames(2, stop_on_ack=False), [ACK, b'MUS:AX1,1'])
+
+    def test_trailing_ack_ends_a_short_reply(self):
+        # a write answered with ACK alone, nothing else waiting
+        reader = FrameReader(ChunkSocket(ACK))
+        self.assertEqual(reader.read_frames(3), [ACK])
+
+    def test_leftover_bytes_wait_for_the_next_read(self):
+        reader = FrameReader(ChunkSocket(STX + b'FDS:AX1,0.0;' + STX + b'FDS:AX2,-5.0;' + STX + b'FD', b'S:AX3,INF;'))
+        self.assertEqual(reader.read_frames(1), [b'FDS:AX1,0.0'])
+        self.assertGreater(reader.pending(), 0)
+        self.assertEqual(reader.read_frames(2), [b'FDS:AX2,-5.0', b'FDS:AX3,INF'])
+        self.assertEqual(reader.pending(), 0)
+
+    def test_buffer_grows_for_long_replies(self):
+        frames = [b'CNS:I%d,"%s"' % (i, b'x' * 200) for i in range(1, 33)]
+        reader = FrameReader(ChunkSocket(b''.join(STX + frame + b';' for frame in frames)), size=64)
+        self.assertEqual(reader.read_frames(len(frames)), frames)
+
+    def test_closed_connection_raises(self):
+        reader = FrameReader(ChunkSocket(STX + b'FDS:AX1'))
+        with self.assertRaises(ConnectionResetError):
+            reader.read_frame()
+
+
+class EmulatorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.proxy = Emulator(latency=RTT, seed=0).__enter__()
+        self.addCleanup(self.proxy.__exit__, None, None, None)
+
+
+class WritePriorityTest(EmulatorTestCase):
+    def test_write_latency_bounded_during_bulk_refresh(self):
+        # a write waits for at most the pipeline window in flight, not for
+        # the BACKGROUND refresh queued ahead of it
+        worker = connected_worker(self.proxy)
+        self.addCleanup(worker.stop)
+        results = run_write_preemption(self.proxy, worker, RTT)
+        self.assertLessEqual(results['priority']['p99_ms'], results['bound_ms'])
+        self.assertLess(results['priority']['p99_ms'], results['fifo']['p99_ms'])
+
+
+class MultiFaderTest(EmulatorTestCase):
+    def test_every_fader_lands_on_its_own_channel(self):
+        results = run_multi_fader(self.proxy, RTT, faders=4, seconds=0.5)
+        for name in ('separate', 'shared'):
+            self.assertTrue(results[name]['final_values_applied'], name)
+
+    def test_shared_coalescer_batches_simultaneous_faders(self):
+        results = run_multi_fader(self.proxy, RTT, faders=6, seconds=0.5)
+        shared = results['shared']
+        self.assertLess(shared['round_trips'], shared['writes'])
+        self.assertGreater(shared['writes'], results['separate']['writes'])
+
+
+class PipelineTest(EmulatorTestCase):
+    def test_replies_stay_with_their_queries_after_a_drop(self):
+        # the dropped socket only fails on the second message of the window,
+        # and a reconnect then must not pair the first's reply with the next
+        session = ProxySession(*self.proxy.server_address, timeout=1)
+        self.addCleanup(session.close)
+        session.refresh_socket()
+        self.proxy.drop_connections()
+        time.sleep(0.1)
+        channels = ['AX1', 'AX2', 'AX3', 'AX4']
+        replies = session.request_many(['FDQ:' + ch for ch in channels], batch_size=1)
+        for ch, reply in zip(channels, replies):
+            if reply is not None:
+                self.assertEqual(reply.ids, (ch,))
+
+
+class OutageTest(EmulatorTestCase):
+    def test_reads_while_offline_do_not_extend_the_backoff(self):
+        # refusals between reconnect attempts are not failures of their own,
+        # so steady background traffic can't keep the session offline
+        worker = connected_worker(self.proxy, keepalive=0.1)
+        self.addCleanup(worker.stop)
+        self.proxy.down = True
+        self.proxy.drop_connections()
+        queries = ['FDQ:AX1', 'FDQ:AX2']
+        deadline = time.perf_counter() + 1.5
+        while time.perf_counter() < deadline:
+            worker.submit_many(queries, priority=BACKGROUND).result()
+            time.sleep(0.05)
+        self.assertLess(worker.session.backoff, RECONNECT_MAX)
+        self.proxy.down = False
+        deadline = time.perf_counter() + 2 * worker.session.backoff + 1
+        replies = [None]
+        while None in replies and time.perf_counter() < deadline:
+            replies = worker.submit_many(queries, priority=BACKGROUND).result()
+            time.sleep(0.05)
+        self.assertNotIn(None, replies)
+
+    def test_batched_writes_survive_a_dropped_connection(self):
+        # faders still moving when the connection drops: their next values
+        # go out as one batch of pipelined messages onto the dead socket.
+        # all of them are lost together and replayed, none is paired with
+        # another message's ACK
+        worker = connected_worker(self.proxy, batch_size=2)
+        self.addCleanup(worker.stop)
+        coalescer = WriteCoalescer(worker, max_rate=5)
+        channels = ['AX%d' % i for i in range(1, 7)]
+
+        def move(level):
+            for ch in channels:
+                coalescer.write('FDC:' + ch, 'FDC:' + ch + ',' + level, final=False)
+
+        def settle(seconds):
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline and (coalescer.pending or coalescer.in_flight):
+                coalescer.pump()
+                time.sleep(0.01)
+
+        move('-10.0')
+        settle(2)
+        # rate limited, so held until the connection is gone
+        move('-20.0')
+        self.proxy.drop_connections()
+        time.sleep(0.25)
+        settle(5)
+        self.assertEqual([self.proxy.model.levels[ch] for ch in channels], ['-20.0'] * len(channels))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from VMixerParser import parse_text
+from VMixerState import MixerState, save_scene, scene_writes, NAME, LEVEL, MUTE, SEND
+
+
+class SnapshotTest(unittest.TestCase):
+    def test_dump_load_round_trip(self):
+        mixer = MixerState()
+        ch, out = mixer.input_ids[0], mixer.output_ids[0]
+        send = next(iter(mixer.send_index))
+        values = {
+            (NAME, (ch,)): 'Kick',
+            (LEVEL, (ch,)): -1.0,
+            (MUTE, (ch,)): 1,
+            (LEVEL, (out,)): 0.0,
+            (MUTE, (out,)): 0,
+            (SEND, send): -1.0,
+        }
+        for key, value in values.items():
+            mixer.set(key, value, 1.0)
+        restored = MixerState()
+        self.assertTrue(restored.load(mixer.dump()))
+        self.assertEqual(restored.restored, set(values))
+        for key, value in values.items():
+            self.assertEqual(restored.get(key), value, key)
+
+    def test_unknown_values_stay_unknown(self):
+        restored = MixerState()
+        self.assertTrue(restored.load(MixerState().dump()))
+        self.assertEqual(restored.restored, set())
+
+
+class WriteOrderTest(unittest.TestCase):
+    def test_reads_wait_for_the_write_ack(self):
+        # a read answered before the write it follows reached the proxy
+        # must not undo the write
+        mixer = MixerState()
+        key = (LEVEL, ('AX1',))
+        mixer.apply_write('FDC:AX1,-10.0', now=1.0)
+        self.assertFalse(mixer.apply_reply(parse_text('FDS:AX1,-20.0'), 2.0, sent=1.5))
+        self.assertEqual(mixer.get(key), -10.0)
+        mixer.write_done('FDC:AX1,-10.0')
+        self.assertTrue(mixer.apply_reply(parse_text('FDS:AX1,-20.0'), 3.0, sent=2.5))
+        self.assertEqual(mixer.get(key), -20.0)
+
+    def test_only_the_last_write_clears(self):
+        mixer = MixerState()
+        mixer.apply_write('FDC:AX1,-10.0', now=1.0)
+        mixer.apply_write('FDC:AX1,-5.0', now=1.1)
+        mixer.write_done('FDC:AX1,-10.0')
+        self.assertFalse(mixer.apply_reply(parse_text('FDS:AX1,-10.0'), 2.0, sent=1.5))
+        self.assertEqual(mixer.get((LEVEL, ('AX1',))), -5.0)
+
+
+class SceneTest(unittest.TestCase):
+    def setUp(self):
+        self.mixer = MixerState()
+        self.mixer.set((LEVEL, ('AX1',)), -10.0, 1.0)
+        self.mixer.set((MUTE, ('AX1',)), 0, 1.0)
+        self.scene = save_scene(self.mixer)
+
+    def test_recall_skips_what_is_in_place(self):
+        self.mixer.set((LEVEL, ('AX1',)), -20.0, 2.0)
+        self.assertEqual(scene_writes(self.mixer, self.scene), ['FDC:AX1,-10.0'])
+
+    def test_unacked_recall_write_is_sent_again(self):
+        self.mixer.set((LEVEL, ('AX1',)), -20.0, 2.0)
+        writes = scene_writes(self.mixer, self.scene)
+        for command in writes:
+            self.mixer.apply_write(command)
+            self.mixer.write_done(command, acked=False)
+        self.assertEqual(scene_writes(self.mixer, self.scene), writes)
+        for command in writes:
+            self.mixer.apply_write(command)
+            self.mixer.write_done(command)
+        self.assertEqual(scene_writes(self.mixer, self.scene), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
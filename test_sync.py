@@ -0,0 +1,85 @@
+import time
+import unittest
+
+from VMixerProtocol import IOWorker
+from VMixerState import MixerState, CachePolicy, key_for_query, NAME, LEVEL, MUTE
+from VMixerSync import ChangePoller, QueryBudget, SendMatrixPrefetcher
+
+
+class BackgroundBudgetTest(unittest.TestCase):
+    # the main page's keys polled and the send matrix prefetched for a
+    # simulated minute at 60 frames/s against a proxy that answers at once
+    def simulate(self, seconds=60.0, rate=40, burst=32):
+        mixer = MixerState()
+        self.now = 0.0
+
+        def batch_cmd(queries, on_replies=None):
+            replies = []
+            for query in queries:
+                key = key_for_query(query)
+                mixer.set(key, 0 if key[0] == MUTE else 'x' if key[0] == NAME else -10.0, self.now)
+                replies.append(object())
+            if on_replies is not None:
+                on_replies(replies)
+
+        budget = QueryBudget(rate, burst)
+        prefetcher = SendMatrixPrefetcher(mixer, CachePolicy(), batch_cmd, 64, 0.5, budget)
+        poller = ChangePoller(mixer, batch_cmd, budget, burst)
+        main_keys = [(field, (ch,)) for ch in mixer.output_ids for field in (NAME, LEVEL, MUTE)]
+        poller.watch(main_keys, self.now)
+        poller.set_visible(main_keys, self.now)
+        while self.now < seconds:
+            self.now += 1 / 60
+            poller.tick(True, self.now)
+            prefetcher.tick(True, self.now)
+        return budget, poller, prefetcher
+
+    def test_poller_and_prefetcher_share_the_budget(self):
+        budget, poller, prefetcher = self.simulate()
+        self.assertEqual(budget.spent, poller.polled + prefetcher.fetched)
+        self.assertLessEqual(budget.spent, 40 * 60 + 32)
+
+    def test_both_still_make_progress(self):
+        budget, poller, prefetcher = self.simulate()
+        self.assertTrue(prefetcher.warm)
+        self.assertGreater(poller.polled, 0)
+
+
+
+class BrokenSession:
+    # every request fails the way an unparsable reply would
+    batch_size = 16
+    window = 4
+    retry_at = 0.0
+    sock = None
+
+    def request_many(self, queries):
+        raise UnicodeDecodeError('ascii', b'\xff', 0, 1, 'ordinal not in range')
+
+    def close(self):
+        pass
+
+
+class FailedRequestTest(unittest.TestCase):
+    def test_background_sync_keeps_going_after_a_failed_request(self):
+        # the done callback is the only thing that clears in_flight, so it
+        # has to run even when the request raised
+        worker = IOWorker(BrokenSession())
+        worker.start()
+        self.addCleanup(worker.stop)
+        mixer = MixerState()
+        prefetcher = SendMatrixPrefetcher(mixer, CachePolicy(), worker.submit_many, 8, 0.0)
+        poller = ChangePoller(mixer, worker.submit_many, 40, 8)
+        poller.watch([(LEVEL, ('AX1',))], 0.0)
+        self.assertTrue(prefetcher.tick(True, 1.0))
+        self.assertTrue(poller.tick(True, 100.0))
+        deadline = time.monotonic() + 5
+        while worker.completed.qsize() < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        worker.drain()
+        self.assertFalse(prefetcher.in_flight)
+        self.assertFalse(poller.in_flight)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import math
+import unittest
+
+import VMixerTaper
+from VMixerParser import NEG_INF
+from VMixerTaper import (
+    LEVELS, LEVEL_TEXTS, MIN_POSITION, level_to_position, position_to_level,
+    position_text, text_position, levels_to_positions, positions_to_levels,
+)
+
+np = VMixerTaper.np
+# positions on a grid finer than the table, plus both ends and past them
+POSITION_GRID = [i / 20000 for i in range(-100, 20101)]
+
+
+class SymmetryTest(unittest.TestCase):
+    def test_every_level_maps_back_to_itself(self):
+        for level in LEVELS:
+            self.assertEqual(position_to_level(level_to_position(level)), level)
+
+    def test_every_level_text_maps_back_to_itself(self):
+        for text in LEVEL_TEXTS:
+            self.assertEqual(position_text(text_position(text)), text)
+
+    def test_rows_match_single_values(self):
+        self.assertEqual(levels_to_positions(LEVELS), [level_to_position(level) for level in LEVELS])
+        self.assertEqual(positions_to_levels(POSITION_GRID), [position_to_level(p) for p in POSITION_GRID])
+
+
+class EdgeTest(unittest.TestCase):
+    def test_unknown_and_silent_levels_are_inf(self):
+        for level in (math.nan, NEG_INF, -80.1, -200.0):
+            self.assertEqual(level_to_position(level), 0.0, level)
+        self.assertEqual(position_to_level(MIN_POSITION / 2), NEG_INF)
+        self.assertEqual(position_to_level(-1.0), NEG_INF)
+
+    def test_levels_above_the_top_clamp(self):
+        self.assertEqual(level_to_position(20.0), 1.0)
+        self.assertEqual(position_to_level(1.5), 10.0)
+
+    def test_negative_zero(self):
+        self.assertEqual(text_position('-0.0'), level_to_position(0.0))
+        self.assertEqual(position_text(text_position('-0.0')), '0.0')
+
+
+@unittest.skipIf(np is None, 'numpy not installed')
+class NumpyTest(unittest.TestCase):
+    def test_levels_match_the_list_path(self):
+        levels = LEVELS + [math.nan, -80.1, 20.0, -0.0, -10.04, -10.06]
+        self.assertEqual(levels_to_positions(np.array(levels)).tolist(), levels_to_positions(levels))
+
+    def test_positions_match_the_list_path(self):
+        self.assertEqual(
+            positions_to_levels(np.array(POSITION_GRID)).tolist(), positions_to_levels(POSITION_GRID)
+        )
+
+    def test_shape_is_kept(self):
+        matrix = np.full((32, 12), -10.0)
+        self.assertEqual(levels_to_positions(matrix).shape, (32, 12))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+
+from VMixerTouch import HitIndex, TouchRouter
+
+
+class Control:
+    # accepts touches inside its rect, records what it was sent
+    def __init__(self, name, rect=None):
+        self.name = name
+        self.rect = rect
+        self.events = []
+
+    def handle_touch_begin(self, pos, panel_pos):
+        x, y, w, h = self.rect
+        inside = x <= panel_pos[0] <= x + w and y <= panel_pos[1] <= y + h
+        if inside:
+            self.events.append('began')
+        return inside
+
+    def handle_touch_drag(self, pos, panel_pos):
+        self.events.append('moved')
+
+    def handle_touch_ended(self, pos, panel_pos):
+        self.events.append('ended')
+
+    def __repr__(self):
+        return self.name
+
+
+class HitIndexTest(unittest.TestCase):
+    def setUp(self):
+        # 100 wide columns: a fader in column 0, a button in column 1 and a
+        # wide label reaching from column 1 into column 2
+        self.index = HitIndex(100, slop=10)
+        self.fader = Control('fader', (40, 0, 20, 200))
+        self.button = Control('button', (120, 50, 60, 60))
+        self.label = Control('label', (150, 250, 100, 30))
+        for elem in (self.fader, self.button, self.label):
+            self.index.add(elem, elem.rect)
+
+    def test_only_the_touched_column(self):
+        self.assertEqual(self.index.candidates(50, 100), [self.fader])
+        self.assertEqual(self.index.candidates(150, 80), [self.button])
+        self.assertEqual(self.index.candidates(350, 80), [])
+
+    def test_slop_around_the_rect(self):
+        self.assertEqual(self.index.candidates(35, 205), [self.fader])
+        self.assertEqual(self.index.candidates(29, 100), [])
+        self.assertEqual(self.index.candidates(50, 211), [])
+
+    def test_control_over_a_column_edge(self):
+        self.assertEqual(self.index.candidates(160, 260), [self.label])
+        self.assertEqual(self.index.candidates(240, 260), [self.label])
+        # the slop reaches over an edge too
+        knob = Control('knob', (102, 300, 20, 20))
+        self.index.add(knob, knob.rect)
+        self.assertEqual(self.index.candidates(95, 310), [knob])
+        self.assertEqual(self.index.candidates(91, 310), [])
+
+    def test_clear(self):
+        self.index.clear()
+        self.assertEqual(self.index.candidates(50, 100), [])
+
+
+class TouchRouterTest(unittest.TestCase):
+    def setUp(self):
+        self.index = HitIndex(100)
+        self.left = Control('left', (0, 0, 100, 200))
+        self.right = Control('right', (100, 0, 100, 200))
+        for elem in (self.left, self.right):
+            self.index.add(elem, elem.rect)
+        self.router = TouchRouter(self.index)
+
+    def test_capture_keeps_moves_with_the_control(self):
+        self.assertIs(self.router.began(1, None, (50, 50)), self.left)
+        # dragged over the other control, still the first one's touch
+        self.router.moved(1, None, (150, 50))
+        self.assertIs(self.router.ended(1, None, (150, 50)), self.left)
+        self.assertEqual(self.left.events, ['began', 'moved', 'ended'])
+        self.assertEqual(self.right.events, [])
+        self.assertEqual(self.router.captured, {})
+
+    def test_held_control_not_offered_to_a_second_touch(self):
+        self.router.began(1, None, (50, 50))
+        self.assertIsNone(self.router.began(2, None, (60, 60)))
+        self.assertIs(self.router.began(3, None, (150, 50)), self.right)
+        self.router.ended(1, None, (50, 50))
+        self.assertIs(self.router.began(4, None, (60, 60)), self.left)
+
+    def test_fixed_controls_come_first(self):
+        title = Control('title', (0, 0, 400, 400))
+        router = TouchRouter(self.index, fixed=[title])
+        self.assertIs(router.began(1, None, (50, 50)), title)
+
+    def test_touch_on_nothing(self):
+        self.assertIsNone(self.router.began(1, None, (500, 50)))
+        self.assertIsNone(self.router.moved(1, None, (500, 60)))
+        self.assertIsNone(self.router.ended(1, None, (500, 60)))
+
+
+if __name__ == '__main__':
+    unittest.main()